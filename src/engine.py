@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from reversi.algorithm import Algorithm
+from reversi.bitboard import Position
+from reversi.book import OpeningBook
+from reversi.game import Player, Utilities
+from reversi.stats import SearchStats
+from reversi.transposition import TranspositionTable
+
+# Tiles of the board text
+TILES = {'X': Player.PLAYER, 'O': Player.COMPUTER, '-': Player.NONE}
+
+
+def parse_board(line):
+    """Read a board: 64 squares of X, O or - row by row, then the side to
+    move, e.g. ``---...XO...--- X``
+
+    :returns: Position
+    """
+    fields = line.split()
+
+    if len(fields) != 2 or len(fields[0]) != 64 \
+            or fields[1] not in ('X', 'O') or set(fields[0]) - set(TILES):
+        raise ValueError("Not a board: " + line.strip())
+
+    squares, side = fields
+
+    matrix = [[TILES[tile] for tile in squares[row * 8:row * 8 + 8]]
+              for row in range(8)]
+    player = TILES[side]
+
+    return Position.from_matrix(matrix, player,
+                                Utilities.get_opponent(player))
+
+
+def analyse(position, time_limit, table, book):
+    """Search the best move of a board
+
+    :returns: line of the move, its score, the depth, the nodes and the
+    principal variation, ``pass`` without a move
+    """
+    if not position.get_moves():
+        return "pass"
+
+    stats = SearchStats(per_node=False)
+    pair = Algorithm.do_iterative_deepening(
+        time_limit, position.to_matrix(), position.player,
+        position.get_positions(), table, book=book, stats=stats)
+
+    return "{} {} {} {} {}".format(
+        SearchStats.get_square_name(pair[0][0] * 8 + pair[0][1]), pair[1],
+        stats.depth, stats.nodes,
+        " ".join(SearchStats.get_square_name(s) for s in stats.pv))
+
+
+parser = argparse.ArgumentParser(
+    description="Headless analysis worker: reads one board a line from "
+                "stdin and writes the best move, its score, the depth, "
+                "the nodes and the principal variation. Needs no Gtk."
+)
+parser.add_argument('--time', type=int, default=1000,
+                    help="thinking time per board in milliseconds")
+parser.add_argument('--table', type=int, default=16,
+                    help="transposition table size in MB")
+parser.add_argument('--book', help="opening book to play from")
+args = parser.parse_args()
+
+table = TranspositionTable(args.table)
+book = OpeningBook(args.book) if args.book else None
+
+for line in sys.stdin:
+    if not line.strip():
+        continue
+
+    try:
+        print(analyse(parse_board(line), args.time, table, book), flush=True)
+    except ValueError as error:
+        print("error", error, flush=True)
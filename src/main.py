@@ -2,6 +2,7 @@
 
 import gi
 import signal
+import sys
 
 gi.require_version('Gtk', '3.0')
 
@@ -13,5 +14,6 @@ from reversi.application import Application
 signal.signal(signal.SIGINT, signal.SIG_DFL)
 
 # Launch game
-application = Application()
+# --debug shows the search stats of the AI's moves
+application = Application(debug='--debug' in sys.argv[1:])
 Gtk.main()
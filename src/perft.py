@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+
+from reversi.perft import Perft
+
+parser = argparse.ArgumentParser(
+    description="Count leaf nodes of the game tree on every board backend, "
+                "check the counts and report nodes/s"
+)
+parser.add_argument('-d', '--depth', type=int, default=5)
+parser.add_argument('-b', '--backend', choices=Perft.BACKENDS, nargs='+',
+                    default=list(Perft.BACKENDS))
+parser.add_argument('--start-only', action='store_true',
+                    help="only count from the start position")
+parser.add_argument('-r', '--rounds', type=int, default=1,
+                    help="number of timed runs of every count")
+parser.add_argument('--json', metavar='FILE',
+                    help="write the timings in pytest-benchmark format")
+args = parser.parse_args()
+
+positions = [('start', Perft.START)]
+
+if not args.start_only:
+    positions += [('position{}'.format(i), text)
+                  for i, (text, counts) in enumerate(Perft.POSITIONS)]
+
+benchmarks = []
+failed = False
+
+print("{:<10} {:<10} {:>5} {:>10} {:>9} {:>11}  {}".format(
+    "position", "backend", "depth", "nodes", "time (s)", "nodes/s", "check"))
+
+for name, text in positions:
+    expected = Perft.get_expected(text, args.depth)
+
+    for backend in args.backend:
+        times = []
+
+        for i in range(args.rounds):
+            nodes, elapsed = Perft.run(backend, text, args.depth)
+            times.append(elapsed)
+
+        # Every backend must agree with the known count, or with the first
+        # backend when the count isn't known
+        if expected is None:
+            expected = nodes
+
+        check = "ok" if nodes == expected else "MISMATCH " + str(expected)
+        failed = failed or nodes != expected
+        best = min(times)
+
+        print("{:<10} {:<10} {:>5} {:>10} {:>9.3f} {:>11.0f}  {}".format(
+            name, backend, args.depth, nodes, best, nodes / best, check))
+
+        benchmarks.append({
+            'group': 'perft',
+            'name': 'perft[{}-{}-{}]'.format(backend, name, args.depth),
+            'fullname': 'perft.py::perft[{}-{}-{}]'.format(backend, name,
+                                                           args.depth),
+            'params': {'backend': backend, 'position': name,
+                       'depth': args.depth},
+            'stats': {
+                'min': best,
+                'max': max(times),
+                'mean': statistics.mean(times),
+                'stddev': statistics.stdev(times) if len(times) > 1 else 0,
+                'median': statistics.median(times),
+                'rounds': len(times),
+                'total': sum(times),
+                'ops': 1 / statistics.mean(times)
+            },
+            'extra_info': {'nodes': nodes, 'nodes_per_second': nodes / best}
+        })
+
+if args.json:
+    with open(args.json, 'w') as f:
+        json.dump({
+            'machine_info': {
+                'node': platform.node(),
+                'processor': platform.processor(),
+                'machine': platform.machine(),
+                'python_implementation': platform.python_implementation(),
+                'python_version': platform.python_version(),
+                'system': platform.system(),
+                'release': platform.release()
+            },
+            'benchmarks': benchmarks,
+            'datetime': datetime.datetime.now(
+                datetime.timezone.utc).isoformat(),
+            'version': '1'
+        }, f, indent=4)
+
+sys.exit(1 if failed else 0)
@@ -1,17 +1,163 @@
 #!/usr/bin/env python3
 
+import os
+import time
+
+from reversi.bitboard import Bitboard, Board
+from reversi.endgame import Endgame
 from reversi.game import Game, Player, Utilities, Field
+from reversi.pattern import PatternBoard, PatternWeights
+from reversi.transposition import TranspositionTable
+
+# LeafBatch, imported by the first search scoring leaves in batches as
+# numpy takes longer to import than the whole engine. False without numpy.
+LeafBatch = None
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its deadline has passed"""
+    pass
+
+
+class SearchCancelled(Exception):
+    """Raised inside a search when its cancel event has been set"""
+    pass
+
+
+class Search:
+    """State shared by every node of one negamax search"""
+
+    # Number of nodes between two deadline checks
+    CHECK_INTERVAL = 256
+
+    def __init__(self, table, deadline=None, cancel=None, stats=None):
+        """
+        :table: TranspositionTable used by the search
+        :deadline: time.monotonic() value to stop at, None for no limit
+        :cancel: threading.Event aborting the search once set
+        :stats: SearchStats to count per node figures in, if it wants them
+        """
+        self.table = table
+        self.deadline = deadline
+        self.cancel = cancel
+        self.nodes = 0
+        self.order = MoveOrder()
+
+        # Only looked at when per node counters are wanted
+        self.stats = stats if stats is not None and stats.per_node else None
+
+    def check_deadline(self):
+        """Raise SearchCancelled if the search has been cancelled,
+        SearchTimeout if the deadline has passed"""
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchCancelled()
+
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+
+
+class MoveOrder:
+    """What a search has learnt about ordering moves: the killer moves of
+    every ply, which cut off a sibling node, and the history of every
+    square, raised by depth squared each time a move there cuts off.
+    """
+
+    # Killer moves kept per ply
+    KILLERS = 2
+
+    def __init__(self):
+        self.killers = []
+        self.history = {Player.PLAYER: [0] * 64, Player.COMPUTER: [0] * 64}
+
+    def get_killers(self, ply):
+        """Get the killer moves of the ply, latest first"""
+        while len(self.killers) <= ply:
+            self.killers.append([])
+
+        return self.killers[ply]
+
+    def add_cutoff(self, player, ply, square, depth):
+        """Record a cutoff of ``player``'s move at ``square``"""
+        killers = self.get_killers(ply)
+
+        if square not in killers:
+            killers.insert(0, square)
+            del killers[MoveOrder.KILLERS:]
+
+        self.history[player][square] += depth * depth
 
 
 class Algorithm:
+    """Search algorithms. The ``do_*`` methods take the GTK matrix and
+    return pair [position, value]; the search itself runs on one mutable
+    Board per call."""
+
+    # Order of the static move classes used by alpha-beta
+    SORT_MASKS = (Field.CORNER_MASK,
+                  Field.BORDER_ADVANTAGE_MASK,
+                  Field.BORDER_DISADVANTAGE_MASK,
+                  Field.DISADVANTAGE_MASK)
+
+    # Static order of negamax moves by square: corner, border advantage,
+    # normal, disadvantage
+    ORDER_RANK = Bitboard.get_ranks((Field.CORNER_MASK,
+                                     Field.BORDER_ADVANTAGE_MASK,
+                                     ~Field.DISADVANTAGE_MASK))
+    DISADVANTAGE_RANK = 3
+
+    # Score bounds of negamax. A finished game is worth WIN_SCORE plus the
+    # disc differential, far above any static evaluation.
+    INFINITY = 1000000
+    WIN_SCORE = 10000
+
+    # Number of empty squares from which the endgame is solved exactly
+    ENDGAME_EMPTIES = 12
+
+    # Leaf value of minimax and alpha_beta_pruning: disc differential,
+    # mobility differential and these weights of the square classes, kept
+    # below the value of a finished game
+    LEAF_WEIGHTS = ((Field.CORNER_MASK, 4),
+                    (Field.BORDER_ADVANTAGE_MASK, 1),
+                    (Field.BORDER_DISADVANTAGE_MASK, -1),
+                    (Bitboard.from_positions(Field.INNER_DISADVANTAGE), -1))
+    LEAF_LIMIT = 63
+
+    # Smallest number of nodes on the deepest level of minimax and
+    # alpha_beta_pruning to score their leaves in one batch, fewer don't
+    # pay off the array set up
+    BATCH_NODES = 4
+
+    # Weights of the pattern evaluation used by evaluate, tuned with
+    # `python3 -m reversi.training`. The hand-tuned seed is used without
+    # the weight file. Loaded by the first evaluation, see
+    # get_pattern_weights.
+    WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'weights.bin')
+    PATTERN_WEIGHTS = None
 
     @staticmethod
-    def do_shallow_scan(matrix, player, avail_moves, get_all=False):
-        """Make a shallow scan on the surface of matrix"""
+    def do_shallow_scan(matrix, player, avail_moves, get_all=False,
+                        stats=None):
+        """Make a shallow scan on the surface of matrix
+
+        :stats: SearchStats to fill in
+        """
+        if stats is not None:
+            stats.nodes += len(avail_moves)
+            stats.depth = 1
+
+            if stats.per_node:
+                stats.count_node(0)
+                stats.leaves += len(avail_moves)
+
         result_list = []
+        own, opp = Bitboard.from_matrix(matrix, player,
+                                        Utilities.get_opponent(player))
 
         for position in avail_moves:
-            val = Game.predict_score(player, position, matrix)
+            flips = Bitboard.get_flips(own, opp,
+                                       position[0] * 8 + position[1])
+            val = flips.bit_count() + 1 if flips else 0
             result_list.append([position,
                                 Utilities.calc_value(player, val)])
 
@@ -21,19 +167,250 @@ class Algorithm:
         return Game.get_best_pair(result_list)
 
     @staticmethod
-    def do_minimax(depth, matrix, player, avail_moves):
-        """Do a plain minimax scan on the matrix for best position"""
+    def do_minimax(depth, matrix, player, avail_moves, stats=None):
+        """Do a plain minimax scan on the matrix for best position
+
+        :stats: SearchStats to fill in
+        """
         # Raise exception (unhandled case)
         if not avail_moves:
             raise Exception("Encountered Error!")
 
-        result_list = []
+        start = time.monotonic()
+        board = Board.from_matrix(matrix, player,
+                                  Utilities.get_opponent(player))
+        moves = Bitboard.from_positions(avail_moves)
+        square, val = Algorithm.search_leaves(Algorithm.minimax, depth,
+                                              board, moves, stats)
+
+        if stats is not None:
+            stats.time += time.monotonic() - start
+            stats.depth = depth + 1
+
+        return [Bitboard.to_position(square), val]
+
+    @staticmethod
+    def do_alpha_beta_pruning(depth, matrix, player, avail_moves,
+                              stats=None):
+        """ Do minimax algorithm with alpha-beta pruning to reduce analysis
+        time and improve AI level
+
+        :stats: SearchStats to fill in
+        """
+
+        # Raise exception (unhandled case)
+        if not avail_moves:
+            raise Exception("Encountered Error!")
+
+        start = time.monotonic()
+        board = Board.from_matrix(matrix, player,
+                                  Utilities.get_opponent(player))
+        moves = Bitboard.from_positions(avail_moves)
+        square, val = Algorithm.search_leaves(Algorithm.alpha_beta_pruning,
+                                              depth, board, moves, stats)
+
+        if stats is not None:
+            stats.time += time.monotonic() - start
+            stats.depth = depth + 1
+
+        return [Bitboard.to_position(square), val]
+
+    @staticmethod
+    def do_negamax(depth, matrix, player, avail_moves, table=None,
+                   stats=None):
+        """Do a negamax search with alpha-beta pruning for best position
+
+        :depth: number of plies to look ahead, at least 1
+        :table: TranspositionTable to reuse between moves of one game
+        :stats: SearchStats to fill in
+        :returns: pair [position, value] with value relative to ``player``
+        """
+        # Raise exception (unhandled case)
+        if not avail_moves:
+            raise Exception("Encountered Error!")
+
+        start = time.monotonic()
+        board = PatternBoard.from_matrix(matrix, player,
+                                         Utilities.get_opponent(player))
+
+        if table is None:
+            table = TranspositionTable()
+
+        table.new_search()
+        search = Search(table, stats=stats)
+        square, val = Algorithm.negamax_root(
+            depth, board, Bitboard.from_positions(avail_moves), search
+        )
+
+        if stats is not None:
+            stats.time += time.monotonic() - start
+            stats.add_iteration(depth, stats.time, search.nodes, square, val)
+            stats.nodes += search.nodes
+            stats.pv = Algorithm.get_pv(board, table, depth)
+
+        return [Bitboard.to_position(square), val]
+
+    @staticmethod
+    def do_iterative_deepening(time_limit, matrix, player, avail_moves,
+                               table=None, max_depth=60, cancel=None,
+                               root_search=None, endgame_empties=None,
+                               book=None, resume=False, stats=None):
+        """Run negamax 1, 2, 3... plies deep until the time is up
 
-        # Determine the opponent
-        if player == Player.PLAYER:
-            opponent = Player.COMPUTER
+        :time_limit: thinking time in milliseconds
+        :table: TranspositionTable to reuse between moves of one game
+        :cancel: threading.Event, SearchCancelled is raised once it is set
+        :root_search: function searching one depth, same arguments as
+        negamax_root (which is the default), e.g. ParallelSearch's
+        :endgame_empties: solve the game exactly from this many empty
+        squares, defaults to ENDGAME_EMPTIES
+        :book: OpeningBook, its moves are played without searching
+        :resume: go on from the depth an earlier search of the board left
+        in ``table``, e.g. pondering, rather than from depth 1
+        :stats: SearchStats to fill in
+        :returns: pair [position, value] of the last completed depth
+        """
+        # Raise exception (unhandled case)
+        if not avail_moves:
+            raise Exception("Encountered Error!")
+
+        start = time.monotonic()
+        deadline = start + time_limit / 1000
+        board = PatternBoard.from_matrix(matrix, player,
+                                         Utilities.get_opponent(player))
+        moves = Bitboard.from_positions(avail_moves)
+        empties = 64 - (board.own | board.opp).bit_count()
+
+        if book is not None:
+            pair = book.get_move(board, moves)
+
+            if pair is not None:
+                return [Bitboard.to_position(pair[0]), pair[1]]
+
+        if table is None:
+            table = TranspositionTable()
+
+        table.new_search()
+        search = Search(table, deadline, cancel, stats)
+        pair = None
+        first_depth = 1
+        entry = table.probe(board.hash) if resume else None
+
+        # Every completed depth of an earlier search stored its best move,
+        # start with it and search one ply deeper. Solving the end again
+        # needs the last depth.
+        if entry is not None and entry[1] == TranspositionTable.EXACT \
+                and entry[2] is not None and moves >> entry[2] & 1:
+            pair = [entry[2], entry[3]]
+            first_depth = min(entry[0] + 1, empties, max_depth)
+
+            if stats is not None:
+                stats.add_iteration(entry[0], 0, 0, *pair)
+
+        if root_search is None:
+            root_search = Algorithm.negamax_root
+
+        if endgame_empties is None:
+            endgame_empties = Algorithm.ENDGAME_EMPTIES
+
+        for depth in range(first_depth, max_depth + 1):
+            first = pair[0] if pair else None
+            iteration_start = time.monotonic()
+            iteration_nodes = search.nodes
+
+            try:
+                pair = root_search(depth, board, moves, search, first)
+            except SearchTimeout:
+                # Take back the moves of the aborted iteration
+                while board.stack:
+                    board.undo_move()
+                break
+
+            if stats is not None:
+                stats.add_iteration(depth,
+                                    time.monotonic() - iteration_start,
+                                    search.nodes - iteration_nodes, *pair)
+                stats.pv = Algorithm.get_pv(board, table, depth)
+
+            # Nothing left to look at
+            if depth >= empties:
+                break
+
+            # Close to the end, play perfectly if the solver finishes in
+            # time. Depth 1 is kept as the fallback.
+            if empties <= endgame_empties:
+                iteration_start = time.monotonic()
+                iteration_nodes = search.nodes
+
+                try:
+                    square, diff = Endgame.solve_root(board, moves, search)
+                    pair = [square, Algorithm.get_win_score(diff)]
+                except SearchTimeout:
+                    # Take back any move of the aborted solve, as for
+                    # negamax, so the board is the root again
+                    while board.stack:
+                        board.undo_move()
+                    break
+
+                if stats is not None:
+                    stats.add_iteration(empties,
+                                        time.monotonic() - iteration_start,
+                                        search.nodes - iteration_nodes,
+                                        *pair)
+                    stats.pv = [square]
+                break
+
+            # The next depth takes several times longer, don't start it
+            # if it can't finish
+            if time.monotonic() - start > (deadline - start) / 2:
+                break
+
+        if pair is None:
+            # Not even depth 1 has finished, take the best ordered move
+            pair = [Algorithm.order_moves(board, moves, 0)[0], 0]
+
+        if stats is not None:
+            stats.nodes += search.nodes
+            stats.time += time.monotonic() - start
+
+        return [Bitboard.to_position(pair[0]), pair[1]]
+
+    @staticmethod
+    def get_end_value(player, own, opp, val):
+        """Get the value of a finished game for the player owning ``own``
+
+        :returns: None if the computer wins (take it right away), otherwise
+        the value relative to ``player``
+        """
+        if player == Player.COMPUTER:
+            computer_val, player_val = own.bit_count(), opp.bit_count()
         else:
-            opponent = Player.PLAYER
+            player_val, computer_val = own.bit_count(), opp.bit_count()
+
+        # Set priority of end game with win flag on top
+        if computer_val > player_val:
+            return None
+
+        if player_val > computer_val:
+            val = -64
+
+        return Utilities.calc_value(player, val)
+
+    @staticmethod
+    def minimax(depth, board, moves, stats=None, leaves=None):
+        """Plain minimax on the board for its side to move
+
+        :moves: bitboard of the moves to scan, must not be empty
+        :stats: SearchStats to count nodes in
+        :leaves: LeafBatch scoring the leaves, see search_leaves
+        :returns: pair [square, value], the value left to search_leaves
+        with ``leaves``
+        """
+        result_list = []
+        player = board.player
+
+        if stats is not None:
+            Algorithm.count_node(stats, board, depth, moves)
 
         #
         # Reached to the deepest part of the given tree
@@ -42,70 +419,215 @@ class Algorithm:
         if depth == 0:
             # Calculate all of the node's values and return the one
             # with highest value
-            for position in avail_moves:
-                val = Game.predict_score(player, position, matrix)
-                result_list.append([position,
-                                    Utilities.calc_value(player, val)])
+            return Algorithm.score_leaves(board, moves, leaves)
 
-            return Game.get_best_pair(result_list)
+        while moves:
+            bit = moves & -moves
+            moves ^= bit
+            square = bit.bit_length() - 1
 
-        for position in avail_moves:
-            matrix_virtual = Utilities.clone_matrix(matrix)
-            val = Game.make_move(player, position, matrix_virtual)
+            val = board.make_move(square).bit_count()
 
             # Check for next turn
-            opponent_moves = Game.get_available_moves(opponent, matrix_virtual)
+            opponent_moves = board.get_moves()
 
             if not opponent_moves:
-                # Check if the player has move on the virtual matrix
-                player_moves = Game.get_available_moves(player, matrix_virtual)
+                # Check if the player has move on the virtual board
+                board.pass_move()
+                player_moves = board.get_moves()
 
                 if not player_moves:
                     # Both has no move, reached to the end game.
-                    player_val, computer_val = \
-                        Utilities.calc_matrix_score(matrix_virtual)
-
-                    # Set priority of end game with win flag on top
-                    if computer_val > player_val:
-                        return [position, 64]
+                    val = Algorithm.get_end_value(player, board.own,
+                                                  board.opp, val)
+                    board.undo_move()
+                    board.undo_move()
 
-                    if player_val > computer_val:
-                        val = -64
+                    if val is None:
+                        return [square, 64]
 
-                    result_list.append([
-                        position, Utilities.calc_value(player, val)
-                    ])
+                    result_list.append([square, val])
                     continue
 
                 # Opponent has no moves at this point
                 # One extra move for current player
-                best_move = Algorithm.do_minimax(depth - 1, matrix_virtual,
-                                                 opponent, opponent_moves)
-                result_list.append([position, best_move[1]])
+                best_move = Algorithm.minimax(depth - 1, board, player_moves,
+                                              stats, leaves)
+                board.undo_move()
+                board.undo_move()
+                result_list.append([square, best_move[1]])
+                continue
 
             # Opponent has move. Process normally.
-            best_move = Algorithm.do_minimax(depth - 1, matrix_virtual,
-                                             opponent, opponent_moves)
-            result_list.append([position, best_move[1]])
+            best_move = Algorithm.minimax(depth - 1, board, opponent_moves,
+                                          stats, leaves)
+            board.undo_move()
+            result_list.append([square, best_move[1]])
+
+        if leaves is not None:
+            return [None, result_list]
 
         return Game.get_best_pair(result_list)
 
     @staticmethod
-    def do_alpha_beta_pruning(depth, matrix, player, avail_moves):
-        """ Do minimax algorithm with alpha-beta pruning to reduce analysis
-        time and improve AI level"""
+    def get_leaf_value(own, opp, square):
+        """Value of moving at ``square`` on the deepest level of minimax
+        and alpha_beta_pruning, for the side owning ``own``"""
+        flips = Bitboard.get_flips(own, opp, square)
+        mover = own | flips | (1 << square)
+        other = opp ^ flips
+        val = mover.bit_count() - other.bit_count()
 
-        # Raise exception (unhandled case)
-        if not avail_moves:
-            raise Exception("Encountered Error!")
+        for mask, weight in Algorithm.LEAF_WEIGHTS:
+            val += weight * ((mover & mask).bit_count() -
+                             (other & mask).bit_count())
+
+        val += Bitboard.get_moves(mover, other).bit_count() - \
+            Bitboard.get_moves(other, mover).bit_count()
 
+        return max(-Algorithm.LEAF_LIMIT, min(Algorithm.LEAF_LIMIT, val))
+
+    @staticmethod
+    def score_leaves(board, moves, leaves=None):
+        """Pick the best move of a node on the deepest level
+
+        :leaves: LeafBatch of the search, the node is added to it and
+        scored later by search_leaves. None to score the moves here.
+        :returns: pair [square, value]
+        """
+        if leaves is not None:
+            index = leaves.add(board.own, board.opp, moves)
+            return [None, (index, board.own, board.opp, moves, board.player)]
+
+        return Algorithm.get_leaf_pair(board.own, board.opp, moves,
+                                       board.player)
+
+    @staticmethod
+    def get_leaf_pair(own, opp, moves, player, values=None):
+        """Pick the best move of a node on the deepest level
+
+        :values: scores of the moves by square, get_leaf_value if not given
+        :returns: pair [square, value]
+        """
+        squares = Bitboard.to_squares(moves)
+
+        if values is None:
+            values = [Algorithm.get_leaf_value(own, opp, square)
+                      for square in squares]
+
+        return Game.get_best_pair([[square, Utilities.calc_value(player, val)]
+                                   for square, val in zip(squares, values)])
+
+    @staticmethod
+    def search_leaves(search, depth, board, moves, stats=None):
+        """Run minimax or alpha_beta_pruning scoring all the leaves of the
+        tree together, when numpy is there and the tree is big enough to
+        be worth it
+
+        The search walks the tree once. With a LeafBatch, nodes of the
+        deepest level are added to it and every node returns its result
+        list in place of its value, the tree is then scored bottom up
+        once the batch is evaluated. The search never looks at the value
+        of a child before its parent is done, so this picks the same
+        moves as scoring every leaf on the way.
+
+        :search: Algorithm.minimax or Algorithm.alpha_beta_pruning
+        :stats: SearchStats to count nodes in
+        :returns: pair [square, value]
+        """
+        global LeafBatch
+
+        if depth == 0:
+            return search(depth, board, moves, stats)
+
+        if LeafBatch is None:
+            try:
+                from reversi.batch import LeafBatch
+            except ImportError:
+                # numpy is optional, leaves are scored one by one without it
+                LeafBatch = False
+
+        if not LeafBatch:
+            return search(depth, board, moves, stats)
+
+        leaves = LeafBatch(Algorithm.LEAF_WEIGHTS, Algorithm.LEAF_LIMIT)
+        square, node = search(depth, board, moves, stats, leaves)
+
+        # The root decided without going down, e.g. a corner
+        if square is not None:
+            return [square, node]
+
+        if len(leaves) >= Algorithm.BATCH_NODES:
+            leaves.evaluate()
+
+        return Algorithm.get_node_pair(node, leaves)
+
+    @staticmethod
+    def get_node_pair(node, leaves):
+        """Score a node left by a search with a LeafBatch
+
+        :node: result list of pairs [square, value or node], or tuple
+        (index, own, opp, moves, player) of a node on the deepest level
+        :leaves: LeafBatch the node was added to, evaluated or not
+        :returns: pair [square, value]
+        """
+        if isinstance(node, tuple):
+            index, own, opp, moves, player = node
+            values = None if leaves.collecting else leaves.get(index)
+
+            return Algorithm.get_leaf_pair(own, opp, moves, player, values)
+
+        return Game.get_best_pair([
+            [square, Algorithm.get_node_pair(val, leaves)[1]
+             if isinstance(val, (list, tuple)) else val]
+            for square, val in node
+        ])
+
+    @staticmethod
+    def count_node(stats, board, depth, moves):
+        """Count a node of minimax or alpha_beta_pruning in stats, with
+        its leaves if it's on the deepest level"""
+        stats.nodes += 1
+
+        if depth == 0:
+            stats.nodes += moves.bit_count()
+
+        if stats.per_node:
+            stats.count_node(len(board.stack) // 3)
+
+            if depth == 0:
+                stats.leaves += moves.bit_count()
+
+    @staticmethod
+    def sort(moves):
+        """Sort moves bitboard to order: advantage > disadvantage > normal
+
+        :returns: list of squares
+        """
+        sorted_ = []
+
+        for mask in Algorithm.SORT_MASKS:
+            sorted_ += Bitboard.to_squares(moves & mask)
+            moves &= ~mask
+
+        # Add remains (normals)
+        return sorted_ + Bitboard.to_squares(moves)
+
+    @staticmethod
+    def alpha_beta_pruning(depth, board, moves, stats=None, leaves=None):
+        """Heuristic alpha-beta scan on the board for its side to move
+
+        :moves: bitboard of the moves to scan, must not be empty
+        :stats: SearchStats to count nodes in
+        :leaves: LeafBatch scoring the leaves, see search_leaves
+        :returns: pair [square, value], the value left to search_leaves
+        with ``leaves``
+        """
         result_list = []
+        player = board.player
 
-        # Determine the opponent
-        if player == Player.PLAYER:
-            opponent = Player.COMPUTER
-        else:
-            opponent = Player.PLAYER
+        if stats is not None:
+            Algorithm.count_node(stats, board, depth, moves)
 
         #
         # Reached to the deepest part of the given tree
@@ -114,107 +636,391 @@ class Algorithm:
         if depth == 0:
             # Calculate all of the node's values and return the one
             # with highest value
-            for position in avail_moves:
-                val = Game.predict_score(player, position, matrix)
-                result_list.append([position,
-                                    Utilities.calc_value(player, val)])
-
-            return Game.get_best_pair(result_list)
+            return Algorithm.score_leaves(board, moves, leaves)
 
         #
         # On the normal state of tree.
         #
 
-        # Sort input
-        avail_moves = Utilities.sort(avail_moves)
-
         # Start to check input for actions
-        for position in avail_moves:
+        for square in Algorithm.sort(moves):
+            bit = 1 << square
+
             # Corner field. Get it at all costs!
-            if position in Field.ADVANTAGE:
-                val = Game.predict_score(player, position, matrix)
-                return [position, Utilities.calc_value(player, val)]
+            if bit & Field.ADVANTAGE_MASK:
+                val = board.get_flips(square).bit_count() + 1
+                return [square, Utilities.calc_value(player, val)]
+
+            flips = board.make_move(square)
+            val = flips.bit_count()
 
             # Disadvantage field. Handle with cares.
-            if position in Field.DISADVANTAGE:
-                # Get player's flips and score
-                player_flips = Game.get_flip_traces(player, position, matrix)
-                player_flips.append(position)
-                matrix_virtual = Utilities.clone_matrix(matrix)
-                player_val = Game.make_move(player, position, matrix_virtual)
+            if bit & Field.DISADVANTAGE_MASK:
+                player_flips = flips | bit
 
                 # Dig down 1 level
-                # Get opponent's possible moves
-                opponent_moves = Game.get_available_moves(opponent,
-                                                          matrix_virtual)
+                # Who cares if opponent doesn't wanna take border?
                 max_penalty = None
 
                 # Check if any of player's flip is on the way of opponent
-                for p in opponent_moves:
-                    # Who cares if opponent doesn't wanna take border?
-                    if p not in Field.BORDER:
-                        continue
+                for p in Bitboard.to_squares(board.get_moves() &
+                                             Field.BORDER_MASK):
+                    opponent_flips = board.get_flips(p)
 
-                    opponent_flips = Game.get_flip_traces(opponent, p,
-                                                          matrix_virtual)
+                    if opponent_flips & player_flips:
+                        penalty = opponent_flips.bit_count() + 1
 
-                    for f in player_flips:
-                        if f in opponent_flips:
-                            if max_penalty is None or \
-                                    max_penalty < (len(opponent_flips) + 1):
-                                max_penalty = len(opponent_flips) + 1
+                        if max_penalty is None or max_penalty < penalty:
+                            max_penalty = penalty
 
                 if max_penalty is None:
                     # No danger thread. Take the advantage of border
-                    if position in Field.BORDER_DISADVANTAGE:
-                        return [position,
-                                Utilities.calc_value(player, player_val)]
+                    if bit & Field.BORDER_DISADVANTAGE_MASK:
+                        board.undo_move()
+                        return [square, Utilities.calc_value(player, val)]
                     else:
                         # Pass to next case (normal field)
                         pass
                 else:
                     result_list.append([
-                        position,
-                        Utilities.calc_value(player, player_val - max_penalty)
+                        square,
+                        Utilities.calc_value(player, val - max_penalty)
                     ])
 
             # Normal field
-            # Check if opponent has move on the virtual matrix
-            matrix_virtual = Utilities.clone_matrix(matrix)
-            val = Game.make_move(player, position, matrix_virtual)
-
             # Check for next turn
-            opponent_moves = Game.get_available_moves(opponent, matrix_virtual)
+            opponent_moves = board.get_moves()
 
             if not opponent_moves:
-                # Check if the player has move on the virtual matrix
-                player_moves = Game.get_available_moves(player, matrix_virtual)
+                # Check if the player has move on the virtual board
+                board.pass_move()
+                player_moves = board.get_moves()
 
                 if not player_moves:
                     # Both has no move, reached to the end game.
-                    player_val, computer_val = \
-                        Utilities.calc_matrix_score(matrix_virtual)
+                    val = Algorithm.get_end_value(player, board.own,
+                                                  board.opp, val)
+                    board.undo_move()
+                    board.undo_move()
 
-                    # Set priority of end game with win flag on top
-                    if computer_val > player_val:
-                        return [position, 64]
+                    if val is None:
+                        return [square, 64]
 
-                    if player_val > computer_val:
-                        val = -64
-
-                    result_list.append([
-                        position, Utilities.calc_value(player, val)
-                    ])
+                    result_list.append([square, val])
                     continue
 
-                result_list.append([position,
+                board.undo_move()
+                board.undo_move()
+                result_list.append([square,
                                     Utilities.calc_value(player, 32)])
                 continue
 
             # Opponent has move. Process normally.
-            best_move = Algorithm.do_alpha_beta_pruning(
-                depth - 1, matrix_virtual, opponent, opponent_moves
-            )
-            result_list.append([position, best_move[1]])
+            best_move = Algorithm.alpha_beta_pruning(depth - 1, board,
+                                                     opponent_moves, stats,
+                                                     leaves)
+            board.undo_move()
+            result_list.append([square, best_move[1]])
+
+        if leaves is not None:
+            return [None, result_list]
 
         return Game.get_best_pair(result_list)
+
+    @staticmethod
+    def evaluate(board, moves):
+        """Static evaluation of a PatternBoard for its side to move
+
+        :moves: bitboard of the legal moves of the side to move
+        """
+        weights = Algorithm.PATTERN_WEIGHTS
+
+        if weights is None:
+            weights = Algorithm.get_pattern_weights()
+
+        return weights.evaluate(board, moves)
+
+    @staticmethod
+    def get_pattern_weights():
+        """Get the weights of the pattern evaluation, loaded on the first
+        call"""
+        if Algorithm.PATTERN_WEIGHTS is None:
+            if os.path.exists(Algorithm.WEIGHTS_PATH):
+                Algorithm.PATTERN_WEIGHTS = PatternWeights.load(
+                    Algorithm.WEIGHTS_PATH)
+            else:
+                Algorithm.PATTERN_WEIGHTS = PatternWeights.get_default()
+
+        return Algorithm.PATTERN_WEIGHTS
+
+    @staticmethod
+    def get_final_score(board):
+        """Exact score of a finished game for the side to move"""
+        return Algorithm.get_win_score(board.own.bit_count() -
+                                       board.opp.bit_count())
+
+    @staticmethod
+    def get_win_score(diff):
+        """Convert the final disc differential to a negamax score"""
+        if diff > 0:
+            return Algorithm.WIN_SCORE + diff
+        if diff < 0:
+            return -Algorithm.WIN_SCORE + diff
+
+        return 0
+
+    @staticmethod
+    def is_dangerous(board, square):
+        """Check if moving at a disadvantage square lets the opponent take
+        a border field by flipping the pieces of this move"""
+        # The board after the move, seen from the opponent. Only the discs
+        # matter here, the board itself is left alone.
+        player_flips = board.get_flips(square) | (1 << square)
+        own = board.opp & ~player_flips
+        opp = board.own | player_flips
+
+        for p in Bitboard.to_squares(Bitboard.get_moves(own, opp) &
+                                     Field.BORDER_MASK):
+            if Bitboard.get_flips(own, opp, p) & player_flips:
+                return True
+
+        return False
+
+    @staticmethod
+    def order_moves(board, moves, depth, first=None, order=None):
+        """Order moves for negamax: the ``first`` move (from the
+        transposition table) if given, then the killer moves of the ply,
+        then by ORDER_RANK with the dangerous disadvantage fields last, the
+        moves of a rank by history
+
+        :order: MoveOrder of the search, None for the static order only
+        :returns: list of squares
+        """
+        ordered = []
+
+        if first is not None and moves >> first & 1:
+            ordered.append(first)
+            moves ^= 1 << first
+
+        rank = Algorithm.ORDER_RANK
+
+        if order is None:
+            squares = sorted(Bitboard.to_squares(moves), key=rank.__getitem__)
+        else:
+            for square in order.get_killers(len(board.stack) // 3):
+                if moves >> square & 1:
+                    ordered.append(square)
+                    moves ^= 1 << square
+
+            history = order.history[board.player]
+            squares = sorted(Bitboard.to_squares(moves),
+                             key=lambda s: (rank[s], -history[s]))
+
+        # Near the leaves the danger check costs more than it saves
+        if depth < 2:
+            return ordered + squares
+
+        dangerous = []
+
+        for square in squares:
+            if rank[square] == Algorithm.DISADVANTAGE_RANK \
+                    and Algorithm.is_dangerous(board, square):
+                dangerous.append(square)
+            else:
+                ordered.append(square)
+
+        return ordered + dangerous
+
+    @staticmethod
+    def negamax(depth, board, alpha, beta, search):
+        """Negamax search with alpha-beta pruning
+
+        :search: Search state shared by the whole search
+        :returns: score of the board for its side to move
+        """
+        search.nodes += 1
+
+        if not search.nodes % Search.CHECK_INTERVAL:
+            search.check_deadline()
+
+        stats = search.stats
+
+        if stats is not None:
+            stats.count_node(len(board.stack) // 3)
+
+        moves = board.get_moves()
+
+        if not moves:
+            board.pass_move()
+
+            if not board.get_moves():
+                # Both has no move, reached to the end game.
+                board.undo_move()
+
+                if stats is not None:
+                    stats.leaves += 1
+
+                return Algorithm.get_final_score(board)
+
+            # Passing doesn't use up depth
+            score = -Algorithm.negamax(depth, board, -beta, -alpha, search)
+            board.undo_move()
+
+            return score
+
+        if depth == 0:
+            if stats is not None:
+                stats.leaves += 1
+
+            return Algorithm.evaluate(board, moves)
+
+        # Reuse what is known of this board
+        table = search.table
+        key = board.hash
+        entry = table.probe(key)
+        first = None
+
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+
+        if entry is not None:
+            entry_depth, flag, first, score = entry[:4]
+
+            if entry_depth >= depth:
+                if flag == TranspositionTable.EXACT:
+                    return score
+
+                if flag == TranspositionTable.LOWER:
+                    if score >= beta:
+                        return score
+                elif score <= alpha:
+                    return score
+
+        alpha_orig = alpha
+        best = -Algorithm.INFINITY
+        best_square = None
+
+        for index, square in enumerate(Algorithm.order_moves(
+                board, moves, depth, first, search.order)):
+            board.make_move(square)
+            score = -Algorithm.negamax(depth - 1, board, -beta, -alpha,
+                                       search)
+            board.undo_move()
+
+            if score > best:
+                best = score
+                best_square = square
+
+                if best > alpha:
+                    alpha = best
+
+                    if alpha >= beta:
+                        search.order.add_cutoff(board.player,
+                                                len(board.stack) // 3,
+                                                square, depth)
+
+                        if stats is not None:
+                            stats.cutoffs += 1
+                            stats.first_cutoffs += index == 0
+                        break
+
+        if best <= alpha_orig:
+            flag = TranspositionTable.UPPER
+        elif best >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+
+        table.store(key, depth, flag, best_square, best)
+
+        return best
+
+    @staticmethod
+    def negamax_root(depth, board, moves, search, first=None):
+        """Search every root move with a full window
+
+        :moves: bitboard of the root moves, must not be empty
+        :first: move to search first, e.g. the best one of the previous
+        iteration. Falls back to the transposition table's move.
+        :returns: pair [square, score]
+        """
+        if first is None:
+            entry = search.table.probe(board.hash)
+            first = entry[2] if entry is not None else None
+
+        if search.stats is not None:
+            search.stats.count_node(0)
+
+        alpha = -Algorithm.INFINITY
+        best_square = None
+
+        for square in Algorithm.order_moves(board, moves, depth, first,
+                                            search.order):
+            board.make_move(square)
+            score = -Algorithm.negamax(depth - 1, board,
+                                       -Algorithm.INFINITY, -alpha, search)
+            board.undo_move()
+
+            if best_square is None or score > alpha:
+                alpha = score
+                best_square = square
+
+        search.table.store(board.hash, depth, TranspositionTable.EXACT,
+                           best_square, alpha)
+
+        return [best_square, alpha]
+
+    @staticmethod
+    def get_move_scores(position, depth, table, cancel=None):
+        """Score every legal move of the Position with a shallow negamax
+
+        :table: TranspositionTable of the scoring searches
+        :cancel: threading.Event, SearchCancelled is raised once it is set
+        :returns: dict square: estimated final disc differential for the
+        side to move
+        """
+        board = PatternBoard.from_position(position)
+        search = Search(table, cancel=cancel)
+        scores = {}
+        table.new_search()
+
+        for square in position.get_squares():
+            board.make_move(square)
+            score = -Algorithm.negamax(depth - 1, board, -Algorithm.INFINITY,
+                                       Algorithm.INFINITY, search)
+            board.undo_move()
+
+            # A finished game is known exactly
+            if score >= Algorithm.WIN_SCORE:
+                scores[square] = score - Algorithm.WIN_SCORE
+            elif score <= -Algorithm.WIN_SCORE:
+                scores[square] = score + Algorithm.WIN_SCORE
+            else:
+                scores[square] = round(score / PatternWeights.DISC)
+
+        return scores
+
+    @staticmethod
+    def get_pv(board, table, length):
+        """Get the principal variation, following the best moves stored in
+        the transposition table from the board
+
+        :returns: list of squares
+        """
+        pv = []
+
+        while len(pv) < length:
+            entry = table.probe(board.hash)
+
+            if entry is None or entry[2] is None \
+                    or not board.get_moves() >> entry[2] & 1:
+                break
+
+            board.make_move(entry[2])
+            pv.append(entry[2])
+
+        for square in pv:
+            board.undo_move()
+
+        return pv
@@ -1,20 +1,61 @@
 #!/usr/bin/env python3
 
+import os
+import time
+
 import gi
 gi.require_version('Gtk', '3.0')
 
 from gi.repository import Gtk, GLib
 
 from reversi.algorithm import Algorithm
+from reversi.book import OpeningBook
 from reversi.drawingarea import DrawingArea
-from reversi.game import Game, GameStatus, GameMode, Player, Utilities
+from reversi.game import Game, GameStatus, GameMode, MoveCache, Player, \
+    Utilities
+from reversi.mcts import MonteCarloSearch
 from reversi.panel import Panel
+from reversi.ponder import Ponder
+from reversi.record import GameRecord, GameRecords
+from reversi.stats import SearchStats
+from reversi.transposition import TranspositionTable
+from reversi.worker import SearchWorker
 
 
 class Application(Gtk.Window):
     """Main window of game"""
 
-    def __init__(self, *args, **kwargs):
+    # Memory cap of the AI's transposition table
+    TABLE_SIZE_MB = 64
+
+    # Thinking time of the AI per move in milliseconds
+    TIME_LIMIT = {GameMode.EASY: 0,
+                  GameMode.NORMAL: 300,
+                  GameMode.HARD: 2000,
+                  GameMode.MONTE_CARLO: 2000}
+
+    # Opening book of the AI, built with `python3 -m reversi.book`
+    BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'book.bin')
+
+    # Depth of the search scoring the hinted moves, and the memory cap of
+    # its transposition table
+    HINT_DEPTH = 4
+    HINT_TABLE_SIZE_MB = 4
+
+    # Every game played is appended to this file, see reversi.record
+    RECORD_PATH = os.path.join(os.path.expanduser('~'), '.reversi',
+                               'games.bin')
+
+    # Number of empty squares from which the AI plays perfectly
+    ENDGAME_EMPTIES = {GameMode.EASY: 0,
+                       GameMode.NORMAL: 10,
+                       GameMode.HARD: 14}
+
+    def __init__(self, *args, debug=False, **kwargs):
+        """
+        :debug: show the search stats of the AI's moves
+        """
         super().__init__(*args, **kwargs)
 
         # Default properties
@@ -23,11 +64,11 @@ class Application(Gtk.Window):
         self.set_resizable(False)
 
         # Default events
-        self.connect('delete-event', Gtk.main_quit)
+        self.connect('delete-event', self.on_delete)
 
         # Game variables
         self.turn = 0
-        self.depth = 0
+        self.time_limit = 0
         self.player_score = 2
         self.computer_score = 2
         self.game_mode = None
@@ -37,6 +78,28 @@ class Application(Gtk.Window):
         self.pre_y = -1
         self.matrix = None
 
+        # Position of the matrix with current_player to move, shared with
+        # the searches so its moves are generated once
+        self.position = None
+
+        # Bitboards of the matrix, updated by make_move
+        self.moves = None
+        self.table = TranspositionTable(Application.TABLE_SIZE_MB)
+        self.worker = SearchWorker(GLib.idle_add)
+        self.book = None
+        self.mcts = MonteCarloSearch()
+        self.ponder = Ponder()
+        self.hint_table = TranspositionTable(Application.HINT_TABLE_SIZE_MB)
+        self.hint_worker = SearchWorker(GLib.idle_add)
+
+        # Moves of the game being played, and when the AI started thinking
+        self.record = None
+        self.search_start = None
+        self.debug = debug
+
+        if os.path.exists(Application.BOOK_PATH):
+            self.book = OpeningBook(Application.BOOK_PATH)
+
         # Initialize the new game
         self.__init_new_game()
 
@@ -65,13 +128,17 @@ class Application(Gtk.Window):
         hcontainer.pack_start(self.screen, True, True, 0)
 
         # Create right panel
-        self.panel = Panel()
+        self.panel = Panel(debug=debug)
         hcontainer.pack_end(self.panel, False, False, 0)
 
         self.panel.btn_start.connect('clicked',
                                      self.on_button_start_clicked)
         self.panel.btn_quit.connect('clicked',
                                     self.on_button_quit_clicked)
+        self.panel.switch_hint.connect('notify::active',
+                                       self.on_switch_hint_toggled)
+        self.panel.switch_scores.connect('notify::active',
+                                         self.on_switch_hint_toggled)
 
         # Display Application Window
         self.show_all()
@@ -79,12 +146,20 @@ class Application(Gtk.Window):
     def __init_new_game(self):
         """Initialize new game"""
 
+        # Drop the search of the previous game
+        self.worker.cancel()
+        self.ponder.clear()
+        self.mcts.tree = None
+
         # Initialize game status
         self.game_state = GameStatus.NONE
         self.current_player = Player.NONE
         self.player_score = 2
         self.computer_score = 2
 
+        # Positions of the previous game won't come back
+        self.table.clear()
+
         # Initialize matrix
         if self.matrix is None:
             self.matrix = [[0 for col in range(8)] for row in range(8)]
@@ -99,13 +174,20 @@ class Application(Gtk.Window):
         self.matrix[3][3] = Player.COMPUTER
         self.matrix[4][4] = Player.COMPUTER
 
+        self.moves = MoveCache(self.matrix)
+
     def start_game(self):
         """Start the game"""
+        # A restarted game is recorded as given up
+        self.save_record(False)
         self.__init_new_game()
+        self.screen.stop_animations()
+        self.screen.set_hints({})
         self.screen.redraw()
 
         # Randomize first player
         self.current_player = Utilities().get_player()
+        self.position = self.moves.get_position(self.current_player)
 
         self.game_state = GameStatus.PLAYING
 
@@ -128,14 +210,21 @@ class Application(Gtk.Window):
         dialog.add_button("I'm new", GameMode.EASY)
         dialog.add_button("I'm good ", GameMode.NORMAL)
         dialog.add_button("Try to beat me", GameMode.HARD)
+        dialog.add_button("Roll the dice", GameMode.MONTE_CARLO)
 
         response = dialog.run()
         dialog.destroy()
 
         # Start game with selected mode
-        if response == GameMode.EASY:
-            self.depth = 1
+        if response not in Application.TIME_LIMIT:
+            response = GameMode.HARD
 
+        self.game_mode = response
+        self.time_limit = Application.TIME_LIMIT[response]
+        self.record = GameRecord(self.current_player, self.game_mode,
+                                 self.time_limit)
+
+        if response == GameMode.EASY:
             dialog_msg = Gtk.MessageDialog(self, 0, Gtk.MessageType.INFO,
                                            Gtk.ButtonsType.OK, "Take it easy")
             dialog_msg.format_secondary_text(
@@ -145,8 +234,6 @@ class Application(Gtk.Window):
             dialog_msg.destroy()
 
         elif response == GameMode.NORMAL:
-            self.depth = 5
-
             dialog_msg = Gtk.MessageDialog(self, 0, Gtk.MessageType.INFO,
                                            Gtk.ButtonsType.OK,
                                            "The Fotune Teller")
@@ -155,9 +242,7 @@ class Application(Gtk.Window):
             )
             dialog_msg.run()
             dialog_msg.destroy()
-        else:  # GameMode.HARD
-            self.depth = 5
-
+        elif response == GameMode.HARD:
             dialog_msg = Gtk.MessageDialog(self, 0, Gtk.MessageType.INFO,
                                            Gtk.ButtonsType.OK,
                                            "Challenge Accepted")
@@ -166,15 +251,31 @@ class Application(Gtk.Window):
             )
             dialog_msg.run()
             dialog_msg.destroy()
+        else:  # GameMode.MONTE_CARLO
+            dialog_msg = Gtk.MessageDialog(self, 0, Gtk.MessageType.INFO,
+                                           Gtk.ButtonsType.OK,
+                                           "Feeling Lucky")
+            dialog_msg.format_secondary_text(
+                "I play thousands of games before every move."
+            )
+            dialog_msg.run()
+            dialog_msg.destroy()
 
         if self.current_player == Player.COMPUTER:
             self.make_move_ai()
+        else:
+            self.update_hints()
+            self.start_pondering()
 
     def pause_game(self):
         """Send the game to 'paused' status"""
 
         self.game_state = GameStatus.PAUSED
 
+        # Stop thinking, the game may be restarted or surrendered
+        self.worker.cancel()
+        self.ponder.clear()
+
         self.panel.btn_start.set_label("Restart")
         self.panel.btn_quit.set_label("Surrender")
 
@@ -192,10 +293,20 @@ class Application(Gtk.Window):
         self.screen.is_paused = False
         self.screen.redraw()
 
+        # Think again about the move cancelled by pause_game
+        if self.current_player == Player.COMPUTER:
+            self.make_move_ai()
+        else:
+            self.start_pondering()
+
     def stop_game(self):
         """Stop game"""
 
         self.game_state = GameStatus.STOPPED
+        self.worker.cancel()
+        self.ponder.clear()
+        self.screen.set_hints({})
+        self.save_record(False)
         self.panel.btn_start.set_label("Start Over")
         self.panel.btn_quit.set_label("Quit")
 
@@ -273,12 +384,23 @@ class Application(Gtk.Window):
             response = dialog.run()
 
             if response == Gtk.ResponseType.OK:
-                Gtk.main_quit(self)
+                self.quit()
             else:
                 pass
 
             dialog.destroy()
 
+    def on_delete(self, widget, *args):
+        """Quit when the window is closed"""
+        self.quit()
+
+    def quit(self):
+        """Record the game being played as given up and quit"""
+        self.worker.cancel()
+        self.hint_worker.cancel()
+        self.save_record(False)
+        Gtk.main_quit()
+
     def on_mouse_pressed_drawingarea(self, widget, event):
         """Handle mouse press event: Save current mouse clicked position and
         pass the event to next handler.
@@ -349,18 +471,27 @@ class Application(Gtk.Window):
         :player: current player
         :position: list of [x, y]
         :screen: screen to draw
-        :returns: True if move made
+        :returns: list of the [row, col] cells changed by the move, False
+        if the move can't be made
 
         """
-        # Make the actual move and get the result
-        score = Game.make_move(self.current_player, position, self.matrix)
-
-        # Redraw screen
-        self.screen.redraw()
+        # Make the actual move and get the result, the move and its flips
+        # are pushed on changes
+        changes = []
+        score = Game.make_move(self.current_player, position, self.matrix,
+                               changes)
 
         if score is False:  # Invalid move
             return False
 
+        # Redraw the cells that changed, the flipped pieces turn over
+        position, flip_stack = changes[0]
+        self.moves.update(self.current_player, position, flip_stack)
+        self.record.add_move(position[0] * 8 + position[1])
+        self.screen.redraw([position])
+        self.screen.flip(flip_stack, self.current_player)
+        cells = [position] + flip_stack
+
         # Update score label
         if self.current_player == Player.PLAYER:
             self.player_score += (score + 1)
@@ -373,31 +504,129 @@ class Application(Gtk.Window):
         self.panel.update_turn_label()
         self.panel.set_score(self.player_score, self.computer_score)
 
+        return cells
+
     def make_move_ai(self):
-        """Makes move for AI
+        """Start the AI's search in the background. The move is made by
+        on_ai_move_found once the search is done.
 
         :returns: none
 
         """
-        avail_moves = Game.get_available_moves(self.current_player,
-                                               self.matrix)
-        pair = []
+        # Hand the worker its own matrix, the search must not see the
+        # matrix change under it
+        position = self.position
+        matrix = position.to_matrix()
+        player = position.player
+        avail_moves = position.get_positions()
+        stats = SearchStats() if self.debug else None
+
+        # Less time left to think after a ponder hit
+        time_limit = self.ponder.get_time_limit(position, self.time_limit)
+        self.search_start = time.monotonic()
 
         if self.game_mode == GameMode.EASY:
-            pair = Algorithm.do_shallow_scan(self.matrix, self.current_player,
-                                             avail_moves)
-        elif self.game_mode == GameMode.NORMAL:
-            pair = Algorithm().do_minimax(self.depth - 1, self.matrix,
-                                          self.current_player, avail_moves)
-        else:  # GameMode.HARD
-            pair = Algorithm().do_alpha_beta_pruning(
-                self.depth - 1, self.matrix, self.current_player, avail_moves
-            )
+            def task(cancel):
+                return Algorithm.do_shallow_scan(matrix, player, avail_moves,
+                                                 stats=stats), stats
+        elif self.game_mode == GameMode.MONTE_CARLO:
+            def task(cancel):
+                return self.mcts.do_search(
+                    time_limit, matrix, player, avail_moves,
+                    cancel=cancel, stats=stats
+                ), stats
+        else:  # GameMode.NORMAL, GameMode.HARD
+            def task(cancel):
+                return Algorithm.do_iterative_deepening(
+                    time_limit, matrix, player, avail_moves,
+                    self.table, cancel=cancel,
+                    endgame_empties=Application.ENDGAME_EMPTIES[
+                        self.game_mode],
+                    book=self.book, resume=True, stats=stats
+                ), stats
+
+        self.worker.start(task, self.on_ai_move_found,
+                          self.on_ai_search_failed)
+
+    def start_pondering(self):
+        """Search in the background while the player thinks, the AI's next
+        search reuses the work on a ponder hit (see Ponder)"""
+        if self.game_mode == GameMode.EASY:
+            return
+
+        position = self.position
+
+        if self.game_mode == GameMode.MONTE_CARLO:
+            # The tree covers every reply
+            replies = [position.play(square)
+                       for square in position.get_squares()]
+            matrix = position.to_matrix()
+
+            def task(cancel):
+                return self.mcts.ponder(Ponder.MAX_TIME, matrix,
+                                        Player.PLAYER, cancel)
+        else:  # GameMode.NORMAL, GameMode.HARD
+            square = Ponder.predict(position, self.table)
+
+            if square is None:
+                return
+
+            reply = position.play(square)
+            replies = [reply]
+            matrix = reply.to_matrix()
+            avail_moves = reply.get_positions()
+
+            # The player would move again, nothing to ponder
+            if not avail_moves:
+                return
+
+            def task(cancel):
+                return Algorithm.do_iterative_deepening(
+                    Ponder.MAX_TIME, matrix, Player.COMPUTER, avail_moves,
+                    self.table, cancel=cancel,
+                    endgame_empties=Application.ENDGAME_EMPTIES[
+                        self.game_mode],
+                    book=self.book
+                )
+
+        self.ponder.begin(replies)
+        self.worker.start(task, self.on_ponder_done)
+
+    def on_ponder_done(self, result):
+        """Pondering has used up its time before the player moved. What it
+        found stays for the AI's next search."""
+        pass
+
+    def on_ai_move_found(self, result):
+        """Make the move found by the AI's search
+
+        :result: tuple (pair [position, value], SearchStats or None)
+        """
+        # The game has moved on while the AI was thinking
+        if self.game_state != GameStatus.PLAYING \
+                or self.current_player != Player.COMPUTER:
+            return
+
+        pair, stats = result
+        self.record.thinking += time.monotonic() - self.search_start
+
+        if stats is not None:
+            self.panel.set_stats(stats)
 
         self.make_move(pair[0])
 
         self.switch_player()
 
+    def on_ai_search_failed(self, error):
+        """Play the move of the shallow scan when the AI's search has
+        failed, so the game goes on. The error has been logged."""
+        position = self.position
+        pair = Algorithm.do_shallow_scan(position.to_matrix(),
+                                         position.player,
+                                         position.get_positions())
+
+        self.on_ai_move_found((pair, None))
+
     def switch_player(self):
         """Switch current player"""
         opponent = None
@@ -407,11 +636,15 @@ class Application(Gtk.Window):
         elif self.current_player == Player.COMPUTER:
             opponent = Player.PLAYER
 
+        self.position = self.moves.get_position(opponent)
+
         # Check if there's any available moves for the opponent
-        if not Game.get_available_moves(opponent, self.matrix):
+        if not self.position.get_moves():
+            self.position = self.moves.get_position(self.current_player)
 
             # Check if both players have no moves
-            if not Game.get_available_moves(self.current_player, self.matrix):
+            if not self.position.get_moves():
+                self.save_record(True)
                 self.stop_game()
 
                 if self.player_score > self.computer_score:
@@ -447,6 +680,8 @@ class Application(Gtk.Window):
                     )
                     dialog.run()
                     dialog.destroy()
+            else:
+                self.record.add_pass()
         else:
             self.current_player = opponent
 
@@ -454,7 +689,76 @@ class Application(Gtk.Window):
         # let it make the way
         if self.current_player == Player.COMPUTER \
                 and self.game_state == GameStatus.PLAYING:
+            # Takes the player's hints off the board
+            self.update_hints()
             self.make_move_ai()
+        elif self.game_state == GameStatus.PLAYING:
+            self.update_hints()
+            self.start_pondering()
+
+    def save_record(self, finished):
+        """Append the game being played to the record file, if it has moves.
+        Nothing is recorded when the file can't be written.
+
+        :finished: whether the game was played to the end
+        """
+        record = self.record
+        self.record = None
+
+        if record is None or not len(record):
+            return
+
+        record.finish(self.player_score, self.computer_score, finished)
+
+        try:
+            os.makedirs(os.path.dirname(Application.RECORD_PATH),
+                        exist_ok=True)
+            GameRecords.append(Application.RECORD_PATH, [record])
+        except OSError:
+            pass
+
+    def update_hints(self):
+        """Show the player's legal moves on the screen at once, and their
+        estimated final disc differential once the background scoring is
+        done if the scores switch is on. Hints are only shown on the
+        player's turn."""
+        hints = {}
+        self.hint_worker.cancel()
+
+        if self.panel.switch_hint.get_active() \
+                and self.game_state == GameStatus.PLAYING \
+                and self.current_player == Player.PLAYER:
+            position = self.position
+            hints = {divmod(square, 8): None
+                     for square in position.get_squares()}
+
+            if self.panel.switch_scores.get_active():
+                table = self.hint_table
+
+                def task(cancel):
+                    return position, Algorithm.get_move_scores(
+                        position, Application.HINT_DEPTH, table, cancel)
+
+                self.hint_worker.start(task, self.on_hint_scores_found)
+
+        self.screen.set_hints(hints)
+
+    def on_hint_scores_found(self, result):
+        """Add the scores to the hints, unless the board has changed since
+
+        :result: pair (Position, dict square: score)
+        """
+        position, scores = result
+
+        if position is not self.position or not self.screen.hints:
+            return
+
+        self.screen.set_hints({divmod(square, 8): score
+                               for square, score in scores.items()})
+
+    def on_switch_hint_toggled(self, switch, *args):
+        """Show or hide the hints as the switches are toggled"""
+        self.update_hints()
 
     def update_score_label(self):
         """ Update the score labels"""
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+import numpy as np
+
+from reversi.bitboard import DIRECTIONS, FULL, INNER_FILES
+from reversi.game import Player
+
+# Masks and shifts as uint64, so every operation stays unsigned
+_FULL = np.uint64(FULL)
+_INNER_FILES = np.uint64(INNER_FILES)
+_SHIFTS = [(np.uint64(shift), np.uint64(left_mask), np.uint64(right_mask))
+           for shift, left_mask, right_mask in DIRECTIONS]
+_ONE = np.uint64(1)
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+class BatchBitboard:
+    """Bitboard helpers working on arrays of boards at once.
+
+    The same operations as Bitboard, on NumPy uint64 arrays (own, opp) of
+    the same shape: item i of both is one board, relative to its side to
+    move. Every call is a fixed number of array operations whatever the
+    number of boards, so the Python overhead is paid once per batch.
+    """
+
+    @staticmethod
+    def count(bits):
+        """Count the set bits of every board
+
+        :returns: int64 array
+        """
+        bits = bits - ((bits >> _ONE) & _M1)
+        bits = (bits & _M2) + ((bits >> np.uint64(2)) & _M2)
+        bits = (bits + (bits >> np.uint64(4))) & _M4
+
+        return ((bits * _H01) >> np.uint64(56)).astype(np.int64)
+
+    @staticmethod
+    def get_moves(own, opp):
+        """Get the legal moves of every board for its side to move"""
+        empty = ~(own | opp) & _FULL
+        inner = opp & _INNER_FILES
+        moves = np.zeros_like(own)
+
+        for (shift, left_mask, right_mask), mask in zip(
+                _SHIFTS, (inner, opp, inner, inner)):
+            line = (own << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            moves |= (line << shift) & empty
+
+            line = (own >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            moves |= (line >> shift) & empty
+
+        return moves
+
+    @staticmethod
+    def get_flips(own, opp, squares):
+        """Get the pieces flipped by moving at the square of every board
+
+        :squares: int array of squares, one per board
+        """
+        bits = _ONE << squares.astype(np.uint64)
+        flips = np.zeros_like(own)
+
+        for shift, left_mask, right_mask in _SHIFTS:
+            # Run of opponent pieces next to the move, kept if an own
+            # piece closes it
+            left_opp = opp & left_mask
+            line = (bits << shift) & left_opp
+            line |= (line << shift) & left_opp
+            line |= (line << shift) & left_opp
+            line |= (line << shift) & left_opp
+            line |= (line << shift) & left_opp
+            line |= (line << shift) & left_opp
+            flips |= np.where((line << shift) & left_mask & own, line, 0)
+
+            right_opp = opp & right_mask
+            line = (bits >> shift) & right_opp
+            line |= (line >> shift) & right_opp
+            line |= (line >> shift) & right_opp
+            line |= (line >> shift) & right_opp
+            line |= (line >> shift) & right_opp
+            line |= (line >> shift) & right_opp
+            flips |= np.where((line >> shift) & right_mask & own, line, 0)
+
+        return flips
+
+    @staticmethod
+    def get_squares(moves):
+        """Split boards of moves into one item per move
+
+        :returns: tuple (board index, square) of int arrays, by board and
+        then by square
+        """
+        bits = (moves[:, None] >> np.arange(64, dtype=np.uint64)) & _ONE
+
+        return np.nonzero(bits)
+
+    @staticmethod
+    def make_moves(own, opp, squares):
+        """Move at the square of every board and pass the turn
+
+        :returns: tuple (own, opp) of the boards after the moves, relative
+        to the opponent now to move
+        """
+        flips = BatchBitboard.get_flips(own, opp, squares)
+
+        return opp ^ flips, own | flips | (_ONE << squares.astype(np.uint64))
+
+
+class LeafBatch:
+    """Nodes on the deepest level of a search, their moves scored at once.
+
+    The search adds every node whose moves are leaves as it meets them,
+    then evaluate scores all those moves in one go and get reads back the
+    scores of a node by the index add gave it. Scores are the same as
+    Algorithm.get_leaf_value.
+    """
+
+    def __init__(self, weights, limit):
+        """
+        :weights: tuples (mask, weight) of the square classes
+        :limit: largest absolute value of a score
+        """
+        self.weights = [(np.uint64(mask), weight) for mask, weight in weights]
+        self.limit = limit
+        self.own = []
+        self.opp = []
+        self.moves = []
+        self.values = None
+        self.offsets = None
+
+    def __len__(self):
+        return len(self.moves)
+
+    @property
+    def collecting(self):
+        """Whether the nodes are still being collected"""
+        return self.values is None
+
+    def add(self, own, opp, moves):
+        """Collect a node, ``own`` being its side to move
+
+        :returns: index of the node
+        """
+        self.own.append(own)
+        self.opp.append(opp)
+        self.moves.append(moves)
+
+        return len(self.moves) - 1
+
+    def evaluate(self):
+        """Score the moves of every collected node"""
+        own = np.array(self.own, dtype=np.uint64)
+        opp = np.array(self.opp, dtype=np.uint64)
+        moves = np.array(self.moves, dtype=np.uint64)
+        index, squares = BatchBitboard.get_squares(moves)
+        own = own[index]
+        opp = opp[index]
+
+        # Boards after every move, from the side that moved
+        flips = BatchBitboard.get_flips(own, opp, squares)
+        mover = own | flips | (_ONE << squares.astype(np.uint64))
+        other = opp ^ flips
+
+        values = BatchBitboard.count(mover) - BatchBitboard.count(other)
+
+        for mask, weight in self.weights:
+            values += weight * (BatchBitboard.count(mover & mask) -
+                                BatchBitboard.count(other & mask))
+
+        values += BatchBitboard.count(BatchBitboard.get_moves(mover, other))
+        values -= BatchBitboard.count(BatchBitboard.get_moves(other, mover))
+
+        self.values = np.clip(values, -self.limit, self.limit).tolist()
+        self.offsets = np.cumsum(BatchBitboard.count(moves)).tolist()
+
+    def get(self, index):
+        """Get the scores of a node's moves, by square"""
+        start = self.offsets[index - 1] if index else 0
+
+        return self.values[start:self.offsets[index]]
+
+
+class GameBatch:
+    """Many games played side by side, every call advancing all of them.
+
+    Boards are kept relative to their side to move, as in Board: ``own``
+    belongs to ``player``. Passes are made as soon as a move leaves the
+    opponent without a move, so the side to move of a running game always
+    has one.
+    """
+
+    def __init__(self, count):
+        self.own = np.full(count, 0x0000000810000000, dtype=np.uint64)
+        self.opp = np.full(count, 0x0000001008000000, dtype=np.uint64)
+        self.player = np.full(count, Player.PLAYER, dtype=np.int8)
+        self.done = np.zeros(count, dtype=bool)
+        self.plies = 0
+
+    def __len__(self):
+        return len(self.own)
+
+    def get_moves(self):
+        """Get the legal moves of every game, 0 for finished ones"""
+        moves = BatchBitboard.get_moves(self.own, self.opp)
+        moves[self.done] = 0
+
+        return moves
+
+    def play(self, squares):
+        """Make one move in every running game
+
+        :squares: int array with the square of every game, ignored for
+        finished games
+        """
+        running = ~self.done
+        own, opp = BatchBitboard.make_moves(self.own[running],
+                                            self.opp[running],
+                                            squares[running])
+        player = self.player[running]
+
+        # Opponent to move, unless it has to pass
+        passes = BatchBitboard.get_moves(own, opp) == 0
+        own[passes], opp[passes] = opp[passes], own[passes]
+        player[~passes] = Player.PLAYER + Player.COMPUTER - player[~passes]
+
+        # Nobody can move, the game is over
+        done = passes & (BatchBitboard.get_moves(own, opp) == 0)
+
+        self.own[running] = own
+        self.opp[running] = opp
+        self.player[running] = player
+        self.done[running] = done
+        self.plies += 1
+
+    def get_scores(self):
+        """Get the discs of both players in every game
+
+        :returns: tuple (Player.PLAYER discs, Player.COMPUTER discs)
+        """
+        own = BatchBitboard.count(self.own)
+        opp = BatchBitboard.count(self.opp)
+        player = self.player == Player.PLAYER
+
+        return np.where(player, own, opp), np.where(player, opp, own)
+
+    @staticmethod
+    def choose_random(own, opp, moves, rng):
+        """Pick a random legal move of every board, -1 without moves
+
+        :rng: numpy.random.Generator
+        """
+        index, squares = BatchBitboard.get_squares(moves)
+        counts = BatchBitboard.count(moves)
+        starts = np.cumsum(counts) - counts
+        chosen = np.full(len(moves), -1, dtype=np.int64)
+        has_moves = counts > 0
+        picks = starts[has_moves] + rng.integers(0, counts[has_moves])
+        chosen[has_moves] = squares[picks]
+
+        return chosen
+
+    @staticmethod
+    def choose_greedy(own, opp, moves, rng):
+        """Pick the move flipping the most pieces on every board, a random
+        one of them on ties, as Algorithm.do_shallow_scan. -1 without
+        moves.
+        """
+        index, squares = BatchBitboard.get_squares(moves)
+        chosen = np.full(len(moves), -1, dtype=np.int64)
+
+        if not len(squares):
+            return chosen
+
+        flips = BatchBitboard.count(BatchBitboard.get_flips(
+            own[index], opp[index], squares))
+
+        # Highest flips then highest random key last within every board
+        order = np.lexsort((rng.random(len(squares)), flips, index))
+        index = index[order]
+        last = np.append(index[1:] != index[:-1], True)
+        chosen[index[last]] = squares[order][last]
+
+        return chosen
+
+    # Move choosers by name
+    POLICIES = {'random': choose_random.__func__,
+                'shallow': choose_greedy.__func__}
+
+    def run(self, policies, rng):
+        """Play every game to the end
+
+        :policies: dict mapping the tile of each player to a chooser of
+        POLICIES
+        :rng: numpy.random.Generator
+        """
+        while not self.done.all():
+            moves = self.get_moves()
+            squares = np.full(len(self), -1, dtype=np.int64)
+
+            for tile, policy in policies.items():
+                boards = (self.player == tile) & ~self.done
+                squares[boards] = policy(self.own[boards], self.opp[boards],
+                                         moves[boards], rng)
+
+            self.play(squares)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Play many games at once with simple move choosers")
+    parser.add_argument('policy_a', choices=sorted(GameBatch.POLICIES))
+    parser.add_argument('policy_b', choices=sorted(GameBatch.POLICIES))
+    parser.add_argument('-n', '--games', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    games = GameBatch(args.games)
+    start = time.monotonic()
+    games.run({Player.PLAYER: GameBatch.POLICIES[args.policy_a],
+               Player.COMPUTER: GameBatch.POLICIES[args.policy_b]}, rng)
+    elapsed = time.monotonic() - start
+    player, computer = games.get_scores()
+
+    print("{} games in {:.2f}s, {:.0f} games/s".format(
+        args.games, elapsed, args.games / elapsed))
+    print("{} (first to move) wins {}, {} wins {}, draws {}".format(
+        args.policy_a, int((player > computer).sum()), args.policy_b,
+        int((player < computer).sum()), int((player == computer).sum())))
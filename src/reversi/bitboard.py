@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+from reversi.transposition import Zobrist
+
+# Square index of a cell is row * 8 + col, bit n of a board is square n
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_A_FILE = 0xFEFEFEFEFEFEFEFE  # Every column but the first one
+NOT_H_FILE = 0x7F7F7F7F7F7F7F7F  # Every column but the last one
+INNER_FILES = NOT_A_FILE & NOT_H_FILE
+
+# Shift amount and the masks to apply after shifting it left / right
+DIRECTIONS = ((1, NOT_A_FILE, NOT_H_FILE),
+              (8, FULL, FULL),
+              (7, NOT_H_FILE, NOT_A_FILE),
+              (9, NOT_A_FILE, NOT_H_FILE))
+
+
+class Bitboard:
+    """Board helpers working on a pair of 64-bit integers (own, opp).
+
+    Every method is relative to the side to move: ``own`` holds the pieces
+    of the player making the move, ``opp`` the pieces of the other one.
+    """
+
+    @staticmethod
+    def from_matrix(matrix, own_tile, opp_tile):
+        """Convert the 8x8 matrix to a pair of bitboards
+
+        :returns: tuple (own, opp)
+        """
+        own = 0
+        opp = 0
+        bit = 1
+
+        for row in matrix:
+            for value in row:
+                if value == own_tile:
+                    own |= bit
+                elif value == opp_tile:
+                    opp |= bit
+                bit <<= 1
+
+        return own, opp
+
+    @staticmethod
+    def fill_matrix(matrix, own, opp, own_tile, opp_tile):
+        """Write the pair of bitboards back to the 8x8 matrix in place"""
+        bit = 1
+
+        for row in range(8):
+            for col in range(8):
+                if own & bit:
+                    matrix[row][col] = own_tile
+                elif opp & bit:
+                    matrix[row][col] = opp_tile
+                else:
+                    matrix[row][col] = 0
+                bit <<= 1
+
+    @staticmethod
+    def from_positions(positions):
+        """Convert list of [row, col] positions to a bitboard"""
+        bits = 0
+
+        for row, col in positions:
+            bits |= 1 << (row * 8 + col)
+
+        return bits
+
+    @staticmethod
+    def get_ranks(masks):
+        """Rank every square by the first of the masks holding it
+
+        :returns: tuple of 64 indices into masks, len(masks) for the
+        squares of none
+        """
+        ranks = []
+
+        for square in range(64):
+            for rank, mask in enumerate(masks):
+                if mask >> square & 1:
+                    break
+            else:
+                rank = len(masks)
+
+            ranks.append(rank)
+
+        return tuple(ranks)
+
+    @staticmethod
+    def to_position(square):
+        """Convert square index to [row, col] position"""
+        return [square >> 3, square & 7]
+
+    @staticmethod
+    def to_squares(bits):
+        """Get the list of square indexes set on the bitboard"""
+        squares = []
+
+        while bits:
+            bit = bits & -bits
+            squares.append(bit.bit_length() - 1)
+            bits ^= bit
+
+        return squares
+
+    @staticmethod
+    def to_positions(bits):
+        """Get the list of [row, col] positions set on the bitboard"""
+        return [[square >> 3, square & 7]
+                for square in Bitboard.to_squares(bits)]
+
+    @staticmethod
+    def get_moves(own, opp):
+        """Get the bitboard of legal moves for the side owning ``own``"""
+        empty = ~(own | opp) & FULL
+
+        # Opponent pieces on the outer files can't be jumped over sideways,
+        # which also stops the shifted bits from wrapping to the next row
+        inner = opp & INNER_FILES
+        moves = 0
+
+        for shift, mask in ((1, inner), (8, opp), (7, inner), (9, inner)):
+            line = (own << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            line |= (line << shift) & mask
+            moves |= (line << shift) & empty
+
+            line = (own >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            line |= (line >> shift) & mask
+            moves |= (line >> shift) & empty
+
+        return moves
+
+    @staticmethod
+    def get_flips(own, opp, square):
+        """Get the bitboard of pieces flipped by moving at ``square``"""
+        flips = 0
+        bit = 1 << square
+
+        for shift, left_mask, right_mask in DIRECTIONS:
+            line = 0
+            cursor = (bit << shift) & left_mask
+
+            while cursor & opp:
+                line |= cursor
+                cursor = (cursor << shift) & left_mask
+
+            if cursor & own:
+                flips |= line
+
+            line = 0
+            cursor = (bit >> shift) & right_mask
+
+            while cursor & opp:
+                line |= cursor
+                cursor = (cursor >> shift) & right_mask
+
+            if cursor & own:
+                flips |= line
+
+        return flips
+
+
+class Board:
+    """Mutable bitboard position with an undo stack.
+
+    ``own`` always belongs to ``player``, the side to move. Searches keep
+    one board and walk the tree with make_move / undo_move instead of
+    copying positions. ``hash`` is the Zobrist hash of the board, updated
+    incrementally on every move.
+    """
+
+    def __init__(self, own, opp, player, opponent):
+        self.own = own
+        self.opp = opp
+        self.player = player
+        self.opponent = opponent
+        self.hash = Zobrist.get_hash(own, opp, player, opponent)
+        self.stack = []
+
+    @staticmethod
+    def from_matrix(matrix, player, opponent):
+        """Create a board from the 8x8 matrix with ``player`` to move"""
+        own, opp = Bitboard.from_matrix(matrix, player, opponent)
+
+        return Board(own, opp, player, opponent)
+
+    @staticmethod
+    def from_position(position):
+        """Create a board from a Position"""
+        return Board(position.own, position.opp, position.player,
+                     position.opponent)
+
+    def get_moves(self):
+        """Get the bitboard of legal moves for the side to move"""
+        return Bitboard.get_moves(self.own, self.opp)
+
+    def get_flips(self, square):
+        """Get the bitboard of pieces flipped by moving at ``square``"""
+        return Bitboard.get_flips(self.own, self.opp, square)
+
+    def make_move(self, square):
+        """Move at ``square`` for the side to move and pass the turn.
+
+        The move must be legal, it is not checked here.
+
+        :returns: bitboard of flipped pieces
+        """
+        bit = 1 << square
+        flips = Bitboard.get_flips(self.own, self.opp, square)
+
+        key = self.hash ^ Zobrist.SIDE ^ Zobrist.KEYS[self.player][square]
+        bits = flips
+        flip_keys = Zobrist.FLIP
+
+        while bits:
+            lowest = bits & -bits
+            key ^= flip_keys[lowest.bit_length() - 1]
+            bits ^= lowest
+
+        self.stack.append(self.hash)
+        self.stack.append(flips)
+        self.stack.append(bit)
+        self.hash = key
+        self.own, self.opp = self.opp ^ flips, self.own | bit | flips
+        self.player, self.opponent = self.opponent, self.player
+
+        return flips
+
+    def pass_move(self):
+        """Pass the turn to the opponent without moving"""
+        self.stack.append(self.hash)
+        self.stack.append(0)
+        self.stack.append(0)
+        self.hash ^= Zobrist.SIDE
+        self.own, self.opp = self.opp, self.own
+        self.player, self.opponent = self.opponent, self.player
+
+    def undo_move(self):
+        """Take back the last move or pass"""
+        bit = self.stack.pop()
+        flips = self.stack.pop()
+        self.hash = self.stack.pop()
+
+        self.own, self.opp = self.opp ^ flips ^ bit, self.own | flips
+        self.player, self.opponent = self.opponent, self.player
+
+
+class Position:
+    """Immutable bitboard position: a board and its side to move.
+
+    Positions are values, hashable and equal when board and side to move
+    are, so one can be shared by the UI and the searches and used as a dict
+    key. Playing a move makes a new Position. The legal moves, disc counts
+    and Zobrist hash are computed on first use and kept.
+    """
+
+    __slots__ = ('own', 'opp', 'player', 'opponent', '_moves', '_squares',
+                 '_discs', '_hash')
+
+    def __init__(self, own, opp, player, opponent):
+        self.own = own
+        self.opp = opp
+        self.player = player
+        self.opponent = opponent
+        self._moves = None
+        self._squares = None
+        self._discs = None
+        self._hash = None
+
+    @staticmethod
+    def from_matrix(matrix, player, opponent):
+        """Create a position from the 8x8 matrix with ``player`` to move"""
+        own, opp = Bitboard.from_matrix(matrix, player, opponent)
+
+        return Position(own, opp, player, opponent)
+
+    def to_matrix(self):
+        """Get a new 8x8 matrix of the board"""
+        matrix = [[0] * 8 for row in range(8)]
+        Bitboard.fill_matrix(matrix, self.own, self.opp, self.player,
+                             self.opponent)
+
+        return matrix
+
+    def get_moves(self):
+        """Get the bitboard of legal moves for the side to move"""
+        if self._moves is None:
+            self._moves = Bitboard.get_moves(self.own, self.opp)
+
+        return self._moves
+
+    def get_squares(self):
+        """Get the tuple of legal move squares for the side to move"""
+        if self._squares is None:
+            self._squares = tuple(Bitboard.to_squares(self.get_moves()))
+
+        return self._squares
+
+    def get_positions(self):
+        """Get a new list of the legal [row, col] positions"""
+        return [[square >> 3, square & 7] for square in self.get_squares()]
+
+    def get_discs(self):
+        """Count the discs of both sides
+
+        :returns: tuple (discs of player, discs of opponent)
+        """
+        if self._discs is None:
+            self._discs = (self.own.bit_count(), self.opp.bit_count())
+
+        return self._discs
+
+    def is_legal(self, square):
+        """Check if the side to move can move at ``square``"""
+        return bool(self.get_moves() >> square & 1)
+
+    def play(self, square):
+        """Get the position after the side to move moves at ``square``. The
+        move must be legal, it is not checked here."""
+        flips = Bitboard.get_flips(self.own, self.opp, square)
+
+        return Position(self.opp ^ flips, self.own | flips | 1 << square,
+                        self.opponent, self.player)
+
+    def pass_move(self):
+        """Get the position with the opponent to move on the same board"""
+        return Position(self.opp, self.own, self.opponent, self.player)
+
+    def __eq__(self, other):
+        return isinstance(other, Position) and self.own == other.own \
+            and self.opp == other.opp and self.player == other.player
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = Zobrist.get_hash(self.own, self.opp, self.player,
+                                          self.opponent)
+
+        return self._hash
+
+    def __repr__(self):
+        return 'Position({:#x}, {:#x}, {}, {})'.format(
+            self.own, self.opp, self.player, self.opponent)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from reversi.algorithm import Algorithm, Search
+from reversi.bitboard import Bitboard
+from reversi.pattern import PatternBoard
+from reversi.game import Player, Utilities
+from reversi.transposition import TranspositionTable
+
+
+class OpeningBook:
+    """Read-only opening book, memory-mapped from a binary file.
+
+    The file is a header followed by fixed size records sorted by the
+    Zobrist hash of the board they are about, so a lookup is a binary
+    search over the mapped file and nothing is loaded up front.
+
+    header: magic, version, record size, record count
+    record: board hash, best move square, search depth, score as an int32,
+    wide enough for any negamax score
+    """
+
+    MAGIC = b'RVBK'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHI')
+    RECORD = struct.Struct('<QBBi')
+    KEY = struct.Struct('<Q')
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, record_size, self.count = \
+            self.HEADER.unpack_from(self.data, 0)
+
+        if magic != self.MAGIC or version != self.VERSION \
+                or record_size != self.RECORD.size:
+            self.data.close()
+            raise ValueError("Not an opening book: " + path)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """Unmap the file"""
+        self.data.close()
+
+    def probe(self, key):
+        """Look up the board with given hash
+
+        :returns: tuple (square, depth, score) or None
+        """
+        data = self.data
+        offset = self.HEADER.size
+        size = self.RECORD.size
+        low = 0
+        high = self.count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.KEY.unpack_from(data, offset + middle * size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.count:
+            record = self.RECORD.unpack_from(data, offset + low * size)
+
+            if record[0] == key:
+                return record[1:]
+
+        return None
+
+    def get_move(self, board, moves):
+        """Get the book move of the board if it's one of ``moves``
+
+        :returns: pair [square, score] or None
+        """
+        record = self.probe(board.hash)
+
+        if record is None or not moves >> record[0] & 1:
+            return None
+
+        return [record[0], record[2]]
+
+    @staticmethod
+    def write(path, entries):
+        """Write the book file
+
+        :entries: dict mapping board hash to tuple (square, depth, score)
+        """
+        with open(path, 'wb') as f:
+            f.write(OpeningBook.HEADER.pack(OpeningBook.MAGIC,
+                                            OpeningBook.VERSION,
+                                            OpeningBook.RECORD.size,
+                                            len(entries)))
+
+            for key in sorted(entries):
+                f.write(OpeningBook.RECORD.pack(key, *entries[key]))
+
+    @staticmethod
+    def build(plies, depth, table_size_mb=64, verbose=False):
+        """Search every board reachable in the first ``plies`` moves, from
+        both starting sides
+
+        :depth: negamax depth of each search
+        :returns: dict mapping board hash to tuple (square, depth, score)
+        """
+        entries = {}
+        table = TranspositionTable(table_size_mb)
+        frontier = []
+
+        for player in (Player.PLAYER, Player.COMPUTER):
+            matrix = [[0 for col in range(8)] for row in range(8)]
+            matrix[3][4] = matrix[4][3] = Player.PLAYER
+            matrix[3][3] = matrix[4][4] = Player.COMPUTER
+            frontier.append(PatternBoard.from_matrix(
+                matrix, player, Utilities.get_opponent(player)
+            ))
+
+        for ply in range(plies):
+            start = time.monotonic()
+            children = []
+
+            for board in frontier:
+                moves = board.get_moves()
+
+                if board.hash in entries or not moves:
+                    continue
+
+                table.new_search()
+                square, score = Algorithm.negamax_root(depth, board, moves,
+                                                       Search(table))
+                entries[board.hash] = (square, depth, score)
+
+                for square in Bitboard.to_squares(moves):
+                    board.make_move(square)
+                    children.append(PatternBoard(board.own, board.opp,
+                                                 board.player,
+                                                 board.opponent))
+                    board.undo_move()
+
+            if verbose:
+                print("ply {}: {} boards, {:.1f}s".format(
+                    ply, len(frontier), time.monotonic() - start))
+
+            frontier = children
+
+        return entries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the opening book")
+    parser.add_argument('--plies', type=int, default=4,
+                        help="number of opening moves covered")
+    parser.add_argument('--depth', type=int, default=8,
+                        help="search depth of every book move")
+    parser.add_argument('--output', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'book.bin'))
+    args = parser.parse_args()
+
+    book = OpeningBook.build(args.plies, args.depth, verbose=True)
+    OpeningBook.write(args.output, book)
+    print("{} boards written to {}".format(len(book), args.output))
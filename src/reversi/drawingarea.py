@@ -1,15 +1,25 @@
 #!/usr/bin/env python3
 
+import math
+
 import gi
 gi.require_version('Gtk', '3.0')
 
 import cairo
 from gi.repository import Gtk, Gdk
 
+from reversi.game import Player, Utilities
+
 
 class DrawingArea(Gtk.DrawingArea):
     """Custom widget to use as game screen"""
 
+    # Length of the flip animation in microseconds of the frame clock
+    FLIP_TIME = 300000
+
+    # Number of pre-rendered widths of a disc turning over
+    SPRITE_STEPS = 12
+
     def __init__(self, matrix, *args):
         Gtk.DrawingArea.__init__(self)
         self.connect('draw', self.__on_draw)
@@ -34,19 +44,56 @@ class DrawingArea(Gtk.DrawingArea):
                            'b': self.player_color['b'],
                            'a': self.player_color['a'] / 2}
 
+        # Background, grid and border texts, drawn once by
+        # __get_board_surface
+        self.board_surface = None
+
+        # Discs by (tile, width step), drawn once by __get_sprite
+        self.sprites = {}
+
+        # Pieces turning over: [row, col] as a tuple to [previous tile,
+        # start time, progress from 0 to 1]
+        self.animations = {}
+        self.tick_id = None
+
+        # Hinted moves drawn over the empty cells, kept out of the matrix:
+        # (row, col) to the move's score or None
+        self.hints = {}
+
         self.set_size_request(self.size, self.size)
         self.show_all()
 
     def __on_draw(self, widget, ctx):
-        # Init board
         if self.is_paused:
             self.__draw_pause_screen(ctx)
-        else:
-            self.__init_board(ctx)
-            self.__draw_matrix(self.matrix, ctx)
+            return
+
+        # Only the dirty area is painted, cairo clips to it
+        ctx.set_source_surface(self.__get_board_surface(), 0, 0)
+        ctx.paint()
+
+        x1, y1, x2, y2 = ctx.clip_extents()
+        rows = [row for row in range(8)
+                if y1 < (row + 2) * self.cell_size
+                and y2 > (row + 1) * self.cell_size]
+        cols = [col for col in range(8)
+                if x1 < (col + 2) * self.cell_size
+                and x2 > (col + 1) * self.cell_size]
+
+        self.__draw_matrix(self.matrix, ctx, rows, cols)
+
+    def __get_board_surface(self):
+        """Get the static board, drawn on the first call"""
+        if self.board_surface is None:
+            self.board_surface = cairo.ImageSurface(
+                cairo.FORMAT_ARGB32, int(math.ceil(self.size)),
+                int(math.ceil(self.size)))
+            self.__init_board(cairo.Context(self.board_surface))
+
+        return self.board_surface
 
     def __init_board(self, ctx):
-        """Draw chess board"""
+        """Draw chess board, without the pieces"""
         ctx.set_antialias(cairo.ANTIALIAS_SUBPIXEL)
         # Fill background's color
         ctx.set_source_rgba(self.bg_color['r'], self.bg_color['g'],
@@ -111,8 +158,6 @@ class DrawingArea(Gtk.DrawingArea):
 
         ctx.stroke()  # Flux ctx
 
-        self.__draw_matrix(self.matrix, ctx)
-
     def draw_piece(self, ctx, position_x, position_y, color,
                    border=False):
         """Draw piece on selected position
@@ -164,25 +209,170 @@ class DrawingArea(Gtk.DrawingArea):
                     self.size / 2 + height / 2)
         ctx.show_text(self.pause_msg)
 
-    def redraw(self):
-        """Redraw screen"""
-        self.queue_draw()
+    def redraw(self, cells=None):
+        """Redraw screen
+
+        :cells: list of [row, col] cells that changed, None to redraw the
+        whole screen
+        """
+        if cells is None:
+            self.queue_draw()
+            return
+
+        size = int(math.ceil(self.cell_size)) + 1
+
+        for row, col in cells:
+            self.queue_draw_area(int((col + 1) * self.cell_size),
+                                 int((row + 1) * self.cell_size),
+                                 size, size)
 
     def set_color(self, player_color, computer_color):
         """Set color for player and computer's pieces"""
         self.player_color = player_color
         self.computer_color = computer_color
+        self.sprites = {}
+
+    def set_hints(self, hints):
+        """Replace the hinted moves, redrawing the cells of the old and the
+        new ones
+
+        :hints: dict (row, col): score to show, or None for no score
+        """
+        cells = set(self.hints) | set(hints)
+        self.hints = dict(hints)
+        self.redraw(cells)
+
+    def flip(self, cells, tile):
+        """Animate pieces turning over to ``tile``, the matrix must already
+        hold the new tile. Frames are driven by the frame clock, each one
+        redraws the turning cells only.
+
+        :cells: list of [row, col] cells
+        """
+        previous = Utilities.get_opponent(tile)
+
+        for row, col in cells:
+            self.animations[row, col] = [previous, None, 0]
+
+        if self.tick_id is None:
+            self.tick_id = self.add_tick_callback(self.__on_tick)
+
+        self.redraw(cells)
+
+    def stop_animations(self):
+        """Show every piece as it is in the matrix"""
+        self.animations.clear()
+
+    def __on_tick(self, widget, frame_clock):
+        """Advance the animations to the frame time"""
+        now = frame_clock.get_frame_time()
+        cells = []
+
+        for cell, animation in list(self.animations.items()):
+            if animation[1] is None:
+                animation[1] = now
+
+            animation[2] = (now - animation[1]) / DrawingArea.FLIP_TIME
+            cells.append(cell)
+
+            if animation[2] >= 1:
+                del self.animations[cell]
+
+        self.redraw(cells)
+
+        if not self.animations:
+            self.tick_id = None
+            return False  # Remove the callback
+
+        return True
+
+    def __draw_matrix(self, matrix, ctx, rows, cols):
+        """Draw the pieces of the given rows and columns on the screen based
+        on matrix. Empty cells are left as the board surface has them."""
+
+        for row in rows:
+            for col in cols:
+                tile = matrix[row][col]
+                animation = self.animations.get((row, col))
+
+                if animation is not None:
+                    # The previous tile narrows down, then the new one
+                    # widens up
+                    scale = 1 - 2 * animation[2]
+
+                    if scale > 0:
+                        tile = animation[0]
+
+                    self.__draw_sprite(ctx, row, col, tile, abs(scale))
+                elif tile == Player.PLAYER or tile == Player.COMPUTER:
+                    self.__draw_sprite(ctx, row, col, tile, 1)
+                elif (row, col) in self.hints:
+                    self.__draw_hint(ctx, row, col, self.hints[row, col])
+
+    def __draw_hint(self, ctx, row, col, score):
+        """Draw the mark of a hinted move, with its score if it has one"""
+        self.draw_piece(ctx, row, col, self.hint_color, False)
+
+        if score is None:
+            return
+
+        text = '{:+d}'.format(score) if score else '0'
+        ctx.select_font_face("PragmataPro for Powerline",
+                             cairo.FONT_SLANT_NORMAL,
+                             cairo.FONT_WEIGHT_BOLD)
+        ctx.set_font_size(self.cell_size / 3)
+        ctx.set_source_rgba(self.bg_color['r'], self.bg_color['g'],
+                            self.bg_color['b'], self.bg_color['a'])
+
+        x_bearing, y_bearing, width, height = ctx.text_extents(text)[:4]
+
+        ctx.move_to((col + 1) * self.cell_size + self.cell_size / 2 -
+                    width / 2 - x_bearing,
+                    (row + 1) * self.cell_size + self.cell_size / 2 -
+                    height / 2 - y_bearing)
+        ctx.show_text(text)
+
+    def __draw_sprite(self, ctx, row, col, tile, scale):
+        """Draw the piece of the tile, ``scale`` times its width"""
+        step = round(min(scale, 1) * DrawingArea.SPRITE_STEPS)
+
+        if not step:
+            return
+
+        x = (col + 1) * self.cell_size
+        y = (row + 1) * self.cell_size
+
+        ctx.set_source_surface(self.__get_sprite(tile, step), x, y)
+        ctx.rectangle(x, y, self.cell_size, self.cell_size)
+        ctx.fill()
+
+    def __get_sprite(self, tile, step):
+        """Get the cell sized picture of a bordered piece, ``step`` /
+        SPRITE_STEPS of its width. Drawn on the first call."""
+        sprite = self.sprites.get((tile, step))
+
+        if sprite is None:
+            size = int(math.ceil(self.cell_size))
+            sprite = cairo.ImageSurface(cairo.FORMAT_ARGB32, size, size)
+            ctx = cairo.Context(sprite)
+            color = self.player_color if tile == Player.PLAYER \
+                else self.computer_color
+
+            # Only the path is scaled, the border keeps its width
+            ctx.save()
+            ctx.translate(self.cell_size / 2, self.cell_size / 2)
+            ctx.scale(step / DrawingArea.SPRITE_STEPS, 1)
+            ctx.arc(0, 0, self.radius, 0, 2 * math.pi)
+            ctx.restore()
+
+            ctx.set_source_rgba(color['r'], color['g'], color['b'],
+                                color['a'])
+            ctx.fill_preserve()
+            ctx.set_line_width(1)
+            ctx.set_source_rgba(self.fg_color['r'], self.fg_color['g'],
+                                self.fg_color['b'], self.fg_color['a'])
+            ctx.stroke()
+
+            self.sprites[tile, step] = sprite
 
-    def __draw_matrix(self, matrix, ctx):
-        """Draw the pieces on the screen based on matrix"""
-
-        for row in range(8):
-            for col in range(8):
-                if matrix[row][col] == 1:
-                    self.draw_piece(ctx, row, col, self.player_color, True)
-                elif matrix[row][col] == 2:
-                    self.draw_piece(ctx, row, col, self.computer_color, True)
-                elif matrix[row][col] == -1:
-                    self.draw_piece(ctx, row, col, self.hint_color, False)
-                else:
-                    self.draw_piece(ctx, row, col, self.bg_color)
+        return sprite
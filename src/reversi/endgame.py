@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+from reversi.bitboard import FULL, Bitboard, Board
+from reversi.game import Utilities
+
+
+class Endgame:
+    """Exact solver for the last empty squares.
+
+    Every score is the final disc differential (own - opp) for the side to
+    move under perfect play. Positions are plain (own, opp) bitboards, the
+    solver needs neither hashing nor an undo stack.
+    """
+
+    # Quadrants of the board, used for parity ordering
+    QUADRANTS = (0x000000000F0F0F0F, 0x00000000F0F0F0F0,
+                 0x0F0F0F0F00000000, 0xF0F0F0F000000000)
+
+    # Above this number of empties moves are ordered fastest-first (fewest
+    # opponent replies), below it the cheaper parity ordering is used
+    FASTEST_FIRST_EMPTIES = 7
+
+    @staticmethod
+    def do_solve(matrix, player, avail_moves, search):
+        """Solve the matrix for ``player``
+
+        :search: Search giving the deadline and counting nodes
+        :returns: pair [position, disc differential]
+        """
+        # Raise exception (unhandled case)
+        if not avail_moves:
+            raise Exception("Encountered Error!")
+
+        board = Board.from_matrix(matrix, player,
+                                  Utilities.get_opponent(player))
+        square, diff = Endgame.solve_root(
+            board, Bitboard.from_positions(avail_moves), search
+        )
+
+        return [Bitboard.to_position(square), diff]
+
+    @staticmethod
+    def solve_root(board, moves, search):
+        """Solve every root move
+
+        :moves: bitboard of the root moves, must not be empty
+        :returns: pair [square, disc differential]
+        """
+        own = board.own
+        opp = board.opp
+        alpha = -65
+        best_square = None
+
+        for square in Endgame.order_moves(own, opp, moves):
+            flips = Bitboard.get_flips(own, opp, square)
+            score = -Endgame.solve(opp ^ flips, own | flips | (1 << square),
+                                   -64, -alpha, search)
+
+            if best_square is None or score > alpha:
+                alpha = score
+                best_square = square
+
+        return [best_square, alpha]
+
+    @staticmethod
+    def get_parity(empty):
+        """Get the quadrants holding an odd number of empty squares"""
+        odd = 0
+
+        for quadrant in Endgame.QUADRANTS:
+            if (empty & quadrant).bit_count() & 1:
+                odd |= quadrant
+
+        return odd
+
+    @staticmethod
+    def order_moves(own, opp, moves):
+        """Order moves fastest-first, or by parity close to the end
+
+        :returns: list of squares
+        """
+        empty = ~(own | opp) & FULL
+
+        if empty.bit_count() <= Endgame.FASTEST_FIRST_EMPTIES:
+            odd = Endgame.get_parity(empty)
+
+            return Bitboard.to_squares(moves & odd) + \
+                Bitboard.to_squares(moves & ~odd)
+
+        scored = []
+
+        for square in Bitboard.to_squares(moves):
+            flips = Bitboard.get_flips(own, opp, square)
+            mobility = Bitboard.get_moves(opp ^ flips,
+                                          own | flips | (1 << square))
+            scored.append((mobility.bit_count(), square))
+
+        scored.sort()
+
+        return [square for mobility, square in scored]
+
+    @staticmethod
+    def solve(own, opp, alpha, beta, search, passed=False):
+        """Negamax with alpha-beta on the exact disc differential
+
+        :search: Search giving the deadline and counting nodes
+        :passed: the opponent has just passed
+        :returns: disc differential for the side owning ``own``
+        """
+        search.nodes += 1
+
+        if not search.nodes % search.CHECK_INTERVAL:
+            search.check_deadline()
+
+        empty = ~(own | opp) & FULL
+        empties = empty.bit_count()
+
+        if empties <= 3:
+            odd = Endgame.get_parity(empty)
+            squares = Bitboard.to_squares(empty & odd) + \
+                Bitboard.to_squares(empty & ~odd)
+
+            if empties == 3:
+                return Endgame.solve_3(own, opp, alpha, beta, *squares)
+            if empties == 2:
+                return Endgame.solve_2(own, opp, alpha, beta, *squares)
+            if empties == 1:
+                return Endgame.solve_1(own, opp, squares[0])
+
+            return own.bit_count() - opp.bit_count()
+
+        moves = Bitboard.get_moves(own, opp)
+
+        if not moves:
+            if passed:
+                return own.bit_count() - opp.bit_count()
+
+            return -Endgame.solve(opp, own, -beta, -alpha, search, True)
+
+        best = -65
+
+        for square in Endgame.order_moves(own, opp, moves):
+            flips = Bitboard.get_flips(own, opp, square)
+            score = -Endgame.solve(opp ^ flips, own | flips | (1 << square),
+                                   -beta, -alpha, search)
+
+            if score > best:
+                best = score
+
+                if best > alpha:
+                    alpha = best
+
+                    if alpha >= beta:
+                        break
+
+        return best
+
+    @staticmethod
+    def solve_1(own, opp, square):
+        """Score of the board with one empty ``square`` left"""
+        diff = own.bit_count() - opp.bit_count()
+        flips = Bitboard.get_flips(own, opp, square).bit_count()
+
+        if flips:
+            return diff + 2 * flips + 1
+
+        flips = Bitboard.get_flips(opp, own, square).bit_count()
+
+        if flips:
+            return diff - 2 * flips - 1
+
+        # Nobody can move there
+        return diff
+
+    @staticmethod
+    def solve_2(own, opp, alpha, beta, x1, x2, passed=False):
+        """Score of the board with the two empty squares x1, x2 left"""
+        best = -65
+        flips = Bitboard.get_flips(own, opp, x1)
+
+        if flips:
+            best = -Endgame.solve_1(opp ^ flips, own | flips | (1 << x1), x2)
+
+            if best >= beta:
+                return best
+
+        flips = Bitboard.get_flips(own, opp, x2)
+
+        if flips:
+            score = -Endgame.solve_1(opp ^ flips, own | flips | (1 << x2), x1)
+
+            if score > best:
+                best = score
+
+        if best == -65:
+            if passed:
+                return own.bit_count() - opp.bit_count()
+
+            return -Endgame.solve_2(opp, own, -beta, -alpha, x1, x2, True)
+
+        return best
+
+    @staticmethod
+    def solve_3(own, opp, alpha, beta, x1, x2, x3, passed=False):
+        """Score of the board with the three empty squares x1, x2, x3 left,
+        given in parity order"""
+        best = -65
+
+        for square, a, b in ((x1, x2, x3), (x2, x1, x3), (x3, x1, x2)):
+            flips = Bitboard.get_flips(own, opp, square)
+
+            if not flips:
+                continue
+
+            score = -Endgame.solve_2(opp ^ flips, own | flips | (1 << square),
+                                     -beta, -alpha, a, b)
+
+            if score > best:
+                best = score
+
+                if best > alpha:
+                    alpha = best
+
+                    if alpha >= beta:
+                        return best
+
+        if best == -65:
+            if passed:
+                return own.bit_count() - opp.bit_count()
+
+            return -Endgame.solve_3(opp, own, -beta, -alpha, x1, x2, x3,
+                                    True)
+
+        return best
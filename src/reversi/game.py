@@ -4,11 +4,14 @@ import random
 import datetime
 import time
 
+from reversi.bitboard import Bitboard, Position
+
 
 class GameMode:
     EASY = 0
     NORMAL = 1
     HARD = 2
+    MONTE_CARLO = 3
 
 
 class GameStatus:
@@ -58,6 +61,20 @@ class Field:
     DISADVANTAGE = INNER_DISADVANTAGE + BORDER_DISADVANTAGE
     NORMAL = INNER_NORMAL
 
+    # Bitboard masks of the fields above, bit n is square row * 8 + col
+    CORNER_MASK = Bitboard.from_positions(CORNER)
+    BORDER_ADVANTAGE_MASK = Bitboard.from_positions(BORDER_ADVANTAGE)
+    BORDER_DISADVANTAGE_MASK = Bitboard.from_positions(BORDER_DISADVANTAGE)
+    BORDER_MASK = Bitboard.from_positions(BORDER)
+    ADVANTAGE_MASK = Bitboard.from_positions(ADVANTAGE)
+    DISADVANTAGE_MASK = Bitboard.from_positions(DISADVANTAGE)
+
+    # Order of Utilities.sort by square: corner, border advantage, border
+    # disadvantage, disadvantage, normal
+    SORT_RANK = Bitboard.get_ranks((CORNER_MASK, BORDER_ADVANTAGE_MASK,
+                                    BORDER_DISADVANTAGE_MASK,
+                                    DISADVANTAGE_MASK))
+
 
 class Utilities:
     """Contains optional static methods as helpers"""
@@ -72,12 +89,9 @@ class Utilities:
         p_score = 0
         c_score = 0
 
-        for row in range(8):
-            for col in range(8):
-                if matrix[row][col] == 1:
-                    p_score += 1
-                elif matrix[row][col] == 2:
-                    c_score += 1
+        for row in matrix:
+            p_score += row.count(Player.PLAYER)
+            c_score += row.count(Player.COMPUTER)
 
         return [p_score, c_score]
 
@@ -99,6 +113,14 @@ class Utilities:
         """Get random player"""
         return random.randint(Player.PLAYER, Player.COMPUTER)
 
+    @staticmethod
+    def get_opponent(player):
+        """Get the opponent of given player"""
+        if player == Player.PLAYER:
+            return Player.COMPUTER
+
+        return Player.PLAYER
+
     @staticmethod
     def get_current_time(fm="%H:%M:%S %d/%m/%Y"):
         return time.strftime(fm)
@@ -110,37 +132,16 @@ class Utilities:
 
     @staticmethod
     def sort(positions):
-        """Sort input positions to order: advantage > disadvantage > normal"""
-        sorted_ = []
+        """Sort input positions to order: advantage > disadvantage > normal
 
-        # Add cornered positions
-        for p in positions:
-            if p in Field.CORNER:
-                sorted_.append(p)
-                positions.remove(p)
-
-        # Add advantage positions
-        for p in positions:
-            if p in Field.BORDER_ADVANTAGE:
-                sorted_.append(p)
-                positions.remove(p)
-
-        # Add disadvantage positions of borders
-        for p in positions:
-            if p in Field.BORDER_DISADVANTAGE:
-                sorted_.append(p)
-                positions.remove(p)
+        :returns: new list, positions of a class keep their input order
+        """
+        buckets = [[] for i in range(max(Field.SORT_RANK) + 1)]
 
-        # Add disadvantage positions
         for p in positions:
-            if p in Field.DISADVANTAGE:
-                sorted_.append(p)
-                positions.remove(p)
+            buckets[Field.SORT_RANK[p[0] * 8 + p[1]]].append(p)
 
-        # Add remains (normals)
-        sorted_ += positions
-
-        return sorted_
+        return [p for bucket in buckets for p in bucket]
 
     @staticmethod
     def calc_value(player, value):
@@ -159,17 +160,10 @@ class Game:
     @staticmethod
     def get_available_moves(player, matrix):
         """Get available list of possible moves"""
-        moves = []
-
-        for row in range(8):
-            for col in range(8):
-                if matrix[row][col] != 0:
-                    continue
-
-                if Game.get_flip_traces(player, [row, col], matrix):
-                    moves.append([row, col])
+        own, opp = Bitboard.from_matrix(matrix, player,
+                                        Utilities.get_opponent(player))
 
-        return moves
+        return Bitboard.to_positions(Bitboard.get_moves(own, opp))
 
     @staticmethod
     def get_best_pair(result_list):
@@ -200,56 +194,16 @@ class Game:
     @staticmethod
     def get_flip_traces(player, position, matrix):
         """Get flip traces at given position."""
-
-        flips = []
         x, y = position[:]
 
         # Return empty list if x, y refer to invalid position
-        if matrix[x][y] != 0 or not Game.is_on_matrix(position):
-            return flips
-
-        tile = player
-
-        if tile == Player.PLAYER:
-            other_tile = Player.COMPUTER
-        elif tile == Player.COMPUTER:
-            other_tile = Player.PLAYER
-
-        # Check for each direction and move forward to find the path
-        for x_direction, y_direction in Field.DIRECTION:
-            x_forward, y_forward = x, y
-            x_forward += x_direction
-            y_forward += y_direction
-
-            if Game.is_on_matrix([x_forward, y_forward]) \
-                    and matrix[x_forward][y_forward] == other_tile:
-                x_forward += x_direction
-                y_forward += y_direction
-
-                if not Game.is_on_matrix([x_forward, y_forward]):
-                    continue
-
-                while matrix[x_forward][y_forward] == other_tile:
-                    x_forward += x_direction
-                    y_forward += y_direction
-
-                    if not Game.is_on_matrix([x_forward, y_forward]):
-                        break
-
-                if not Game.is_on_matrix([x_forward, y_forward]):
-                    continue
+        if not Game.is_on_matrix(position) or matrix[x][y] != 0:
+            return []
 
-                if matrix[x_forward][y_forward] == tile:
-                    while True:
-                        x_forward -= x_direction
-                        y_forward -= y_direction
+        own, opp = Bitboard.from_matrix(matrix, player,
+                                        Utilities.get_opponent(player))
 
-                        if x_forward == x and y_forward == y:
-                            break
-
-                        flips.append([x_forward, y_forward])
-
-        return flips
+        return Bitboard.to_positions(Bitboard.get_flips(own, opp, x * 8 + y))
 
     @staticmethod
     def is_on_matrix(position):
@@ -262,9 +216,11 @@ class Game:
         return True
 
     @staticmethod
-    def make_move(player, position, matrix):
+    def make_move(player, position, matrix, undo_stack=None):
         """Make move at the given position
 
+        :undo_stack: optional list, the move and its flip list are pushed
+        on it so the move can be taken back with undo_move
         :returns: Length of flipped pieces. False if move can't be made.
         """
         row, col = position[:]
@@ -275,6 +231,9 @@ class Game:
         if not flip_stack:
             return False
 
+        if undo_stack is not None:
+            undo_stack.append([position, flip_stack])
+
         # Fill the flip list and player moves in matrix
         for i in range(len(flip_stack)):
             x, y = flip_stack[i][:]
@@ -283,3 +242,66 @@ class Game:
         matrix[row][col] = player
 
         return len(flip_stack)
+
+    @staticmethod
+    def undo_move(matrix, undo_stack):
+        """Take back the last move pushed on undo_stack by make_move
+
+        :returns: The position of the move taken back.
+        """
+        position, flip_stack = undo_stack.pop()
+        row, col = position[:]
+
+        # Flipped pieces go back to the opponent of the mover
+        opponent = Utilities.get_opponent(matrix[row][col])
+
+        for x, y in flip_stack:
+            matrix[x][y] = opponent
+
+        matrix[row][col] = Player.NONE
+
+        return position
+
+
+class MoveCache:
+    """Discs and legal moves of a game kept up to date move by move.
+
+    The bitboards of both players are changed by the flips of every move
+    instead of scanning the matrix, and the Position of each side to move
+    is made once per move, so its legal moves are generated at most once.
+    """
+
+    def __init__(self, matrix):
+        black, white = Bitboard.from_matrix(matrix, Player.PLAYER,
+                                            Player.COMPUTER)
+        self.discs = {Player.PLAYER: black, Player.COMPUTER: white}
+        self.positions = {}
+
+    def update(self, player, position, flip_stack):
+        """Apply a move made on the matrix by Game.make_move
+
+        :position: [row, col] of the move
+        :flip_stack: list of the flipped [row, col] positions
+        """
+        flips = Bitboard.from_positions(flip_stack)
+        opponent = Utilities.get_opponent(player)
+
+        self.discs[player] |= flips | 1 << (position[0] * 8 + position[1])
+        self.discs[opponent] &= ~flips
+        self.positions = {}
+
+    def get_position(self, player):
+        """Get the Position of the board with ``player`` to move"""
+        position = self.positions.get(player)
+
+        if position is None:
+            opponent = Utilities.get_opponent(player)
+            position = Position(self.discs[player], self.discs[opponent],
+                                player, opponent)
+            self.positions[player] = position
+
+        return position
+
+    def get_moves(self, player):
+        """Get the bitboard of legal moves of ``player``"""
+        return self.get_position(player).get_moves()
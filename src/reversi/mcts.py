@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import math
+import multiprocessing
+import random
+import time
+
+from reversi.algorithm import SearchCancelled
+from reversi.bitboard import Bitboard
+from reversi.game import Field, Utilities
+
+
+class Node:
+    """A board of the search tree.
+
+    ``own`` is the side to move, passes are made on creation. ``wins``
+    counts the playouts won by the side that moved into the node, half a
+    win for a draw.
+    """
+
+    __slots__ = ('own', 'opp', 'root_to_move', 'untried', 'children',
+                 'visits', 'wins')
+
+    def __init__(self, own, opp, root_to_move):
+        """
+        :root_to_move: whether the side to move is the root's
+        """
+        moves = Bitboard.get_moves(own, opp)
+
+        if not moves:
+            passed = Bitboard.get_moves(opp, own)
+
+            if passed:
+                own, opp, moves = opp, own, passed
+                root_to_move = not root_to_move
+
+        self.own = own
+        self.opp = opp
+        self.root_to_move = root_to_move
+        self.untried = moves
+        self.children = {}
+        self.visits = 0
+        self.wins = 0.0
+
+
+class MonteCarlo:
+    """UCT search: every iteration walks down the tree by the UCB1 formula,
+    adds one node and plays the game out with random moves."""
+
+    # Weight of exploration against the win rate in UCB1
+    EXPLORATION = 1.4
+
+    # Number of playouts between two deadline checks
+    CHECK_INTERVAL = 16
+
+    # Squares diagonally next to the corners, avoided by guided playouts
+    X_SQUARES_MASK = Bitboard.from_positions([[1, 1], [1, 6],
+                                              [6, 1], [6, 6]])
+
+    @staticmethod
+    def pick(moves, rng):
+        """Pick a random square of the bitboard"""
+        for i in range(rng.randrange(moves.bit_count())):
+            moves &= moves - 1
+
+        return (moves & -moves).bit_length() - 1
+
+    @staticmethod
+    def playout(own, opp, rng, guided=True):
+        """Play random moves to the end of the game. Guided playouts take
+        a corner when they can and stay off the X squares.
+
+        :returns: final disc differential for the side owning ``own``
+        """
+        sign = 1
+        passed = False
+
+        while True:
+            moves = Bitboard.get_moves(own, opp)
+
+            if not moves:
+                # Both has no move, reached to the end game.
+                if passed:
+                    break
+
+                own, opp = opp, own
+                sign = -sign
+                passed = True
+                continue
+
+            passed = False
+
+            if guided:
+                if moves & Field.CORNER_MASK:
+                    moves &= Field.CORNER_MASK
+                elif moves & ~MonteCarlo.X_SQUARES_MASK:
+                    moves &= ~MonteCarlo.X_SQUARES_MASK
+
+            square = MonteCarlo.pick(moves, rng)
+            flips = Bitboard.get_flips(own, opp, square)
+            own, opp = opp ^ flips, own | flips | (1 << square)
+            sign = -sign
+
+        return sign * (own.bit_count() - opp.bit_count())
+
+    @staticmethod
+    def select(node):
+        """Get the child with the highest UCB1 value
+
+        :returns: pair (square, child)
+        """
+        log_visits = math.log(node.visits)
+        best = None
+        best_value = -1
+
+        for square, child in node.children.items():
+            value = child.wins / child.visits + MonteCarlo.EXPLORATION * \
+                math.sqrt(log_visits / child.visits)
+
+            if value > best_value:
+                best = (square, child)
+                best_value = value
+
+        return best
+
+    @staticmethod
+    def search(root, rng, playouts=None, deadline=None, cancel=None,
+               guided=True):
+        """Grow the tree of ``root`` until the playouts or the time are used
+        up. Every root move is tried once whatever the deadline.
+
+        :cancel: threading.Event, SearchCancelled is raised once it is set
+        :returns: tuple (number of playouts, depth of the tree)
+        """
+        count = 0
+        depth = 0
+
+        while playouts is None or count < playouts:
+            if count % MonteCarlo.CHECK_INTERVAL == 0:
+                if cancel is not None and cancel.is_set():
+                    raise SearchCancelled()
+
+                if deadline is not None and not root.untried \
+                        and time.monotonic() > deadline:
+                    break
+
+            # Selection
+            node = root
+            path = [root]
+
+            while not node.untried and node.children:
+                node = MonteCarlo.select(node)[1]
+                path.append(node)
+
+            # Expansion
+            if node.untried:
+                square = MonteCarlo.pick(node.untried, rng)
+                bit = 1 << square
+                flips = Bitboard.get_flips(node.own, node.opp, square)
+                child = Node(node.opp ^ flips, node.own | flips | bit,
+                             not node.root_to_move)
+                node.untried ^= bit
+                node.children[square] = child
+                path.append(child)
+                node = child
+
+            # Simulation, result for the root's side
+            diff = MonteCarlo.playout(node.own, node.opp, rng, guided)
+
+            if not node.root_to_move:
+                diff = -diff
+
+            result = 1.0 if diff > 0 else 0.5 if diff == 0 else 0.0
+
+            # Backpropagation
+            root.visits += 1
+
+            for parent, child in zip(path, path[1:]):
+                child.visits += 1
+                child.wins += result if parent.root_to_move else 1 - result
+
+            count += 1
+            depth = max(depth, len(path) - 1)
+
+        return count, depth
+
+    @staticmethod
+    def get_root_stats(root):
+        """Get the visits and wins of every root move
+
+        :returns: dict square: [visits, wins]
+        """
+        return {square: [child.visits, child.wins]
+                for square, child in root.children.items()}
+
+    @staticmethod
+    def get_pv(root, length):
+        """Follow the most visited moves from the root"""
+        pv = []
+        node = root
+
+        while node.children and len(pv) < length:
+            square, node = max(node.children.items(),
+                               key=lambda item: item[1].visits)
+            pv.append(square)
+
+        return pv
+
+
+# Stop event of a pool worker process, set up by _init_worker
+_stop = None
+
+
+def _init_worker(stop):
+    """Initialize a pool worker process"""
+    global _stop
+
+    _stop = stop
+
+
+def _search_root(own, opp, playouts, deadline, guided, seed):
+    """Grow a tree of its own in a pool worker, until the playouts or the
+    time are used up or the shared stop event is set
+
+    :returns: tuple (root move stats, playouts, depth), None when stopped
+    """
+    root = Node(own, opp, True)
+
+    try:
+        count, depth = MonteCarlo.search(root, random.Random(seed),
+                                         playouts, deadline, _stop, guided)
+    except SearchCancelled:
+        return None
+
+    return MonteCarlo.get_root_stats(root), count, depth
+
+
+class MonteCarloSearch:
+    """MCTS player of the GTK matrix.
+
+    With several workers the search is root-parallel: every process grows
+    a tree of its own from the same board, and the visits and wins of the
+    root moves are added up at the end. A shared stop event ends the
+    workers' searches when the search is cancelled.
+    """
+
+    # Time between two checks of the cancel event while the workers search
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, workers=1, guided=True, rng=random):
+        """
+        :workers: number of processes, 1 searches in this one
+        :guided: use guided playouts instead of uniformly random ones
+        :rng: random generator, e.g. random.Random(seed)
+        """
+        self.workers = workers
+        self.guided = guided
+        self.rng = rng
+        self.pool = None
+        self.stop = None
+
+        # Tree grown by ponder
+        self.tree = None
+
+        if workers > 1:
+            self.stop = multiprocessing.Event()
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=_init_worker, initargs=(self.stop,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def ponder(self, time_limit, matrix, player, cancel=None):
+        """Grow the tree of the board with the opponent ``player`` to move,
+        until the time is up or it is cancelled. The next search reuses the
+        subtree of the move played, in this process only.
+
+        :time_limit: pondering time in milliseconds
+        """
+        own, opp = Bitboard.from_matrix(matrix, player,
+                                        Utilities.get_opponent(player))
+        self.tree = Node(own, opp, True)
+
+        MonteCarlo.search(self.tree, self.rng,
+                          deadline=time.monotonic() + time_limit / 1000,
+                          cancel=cancel, guided=self.guided)
+
+    def get_subtree(self, own, opp):
+        """Take the pondered subtree of the board, None if it isn't one of
+        the pondered replies. The rest of the tree is dropped.
+        """
+        tree = self.tree
+        self.tree = None
+
+        if tree is not None:
+            for child in tree.children.values():
+                if child.own == own and child.opp == opp:
+                    return child
+
+        return None
+
+    def search(self, own, opp, playouts=None, deadline=None, cancel=None):
+        """Search a board with moves for the side owning ``own``
+
+        :playouts: total number of playouts of all workers
+        :returns: tuple (root move stats, playouts, depth, pv)
+        """
+        if self.pool is None:
+            root = self.get_subtree(own, opp) or Node(own, opp, True)
+            count, depth = MonteCarlo.search(root, self.rng, playouts,
+                                             deadline, cancel, self.guided)
+
+            return (MonteCarlo.get_root_stats(root), count, depth,
+                    MonteCarlo.get_pv(root, depth))
+
+        shares = [None] * self.workers
+        self.stop.clear()
+
+        if playouts is not None:
+            shares = [playouts // self.workers + (i < playouts % self.workers)
+                      for i in range(self.workers)]
+
+        futures = [self.pool.submit(_search_root, own, opp, share, deadline,
+                                    self.guided, self.rng.getrandbits(32))
+                   for share in shares]
+
+        try:
+            while concurrent.futures.wait(futures, MonteCarloSearch.
+                                          POLL_INTERVAL).not_done:
+                if cancel is not None and cancel.is_set():
+                    raise SearchCancelled()
+        finally:
+            # Stop the running searches and wait for them, so none of them
+            # is still running when the stop event is cleared again
+            self.stop.set()
+
+            for future in futures:
+                future.cancel()
+
+            concurrent.futures.wait(futures)
+
+        merged = {}
+        count = depth = 0
+
+        for future in futures:
+            children, worker_count, worker_depth = future.result()
+            count += worker_count
+            depth = max(depth, worker_depth)
+
+            for square, (visits, wins) in children.items():
+                total = merged.setdefault(square, [0, 0.0])
+                total[0] += visits
+                total[1] += wins
+
+        best = max(merged, key=lambda square: merged[square][0])
+
+        return merged, count, depth, [best]
+
+    def do_search(self, time_limit, matrix, player, avail_moves,
+                  playouts=None, cancel=None, stats=None):
+        """Choose the most visited root move
+
+        :time_limit: thinking time in milliseconds, None for no limit
+        :playouts: number of playouts, None for no limit, one of them must
+        be given
+        :cancel: threading.Event, SearchCancelled is raised once it is set
+        :stats: SearchStats to fill in, nodes are playouts
+        :returns: pair [position, value], value is the win rate of the
+        move in percent
+        """
+        # Raise exception (unhandled case)
+        if not avail_moves:
+            raise Exception("Encountered Error!")
+
+        if time_limit is None and playouts is None:
+            raise ValueError("Neither a time limit nor a playout count")
+
+        start = time.monotonic()
+        deadline = start + time_limit / 1000 \
+            if time_limit is not None else None
+        own, opp = Bitboard.from_matrix(matrix, player,
+                                        Utilities.get_opponent(player))
+        children, count, depth, pv = self.search(own, opp, playouts,
+                                                 deadline, cancel)
+        square = max(children, key=lambda square: children[square][0])
+        visits, wins = children[square]
+        val = round(100 * wins / visits)
+
+        if stats is not None:
+            elapsed = time.monotonic() - start
+            stats.add_iteration(depth, elapsed, count, square, val)
+            stats.nodes += count
+            stats.time += elapsed
+            stats.pv = pv
+
+        return [Bitboard.to_position(square), val]
+
+
+def report_speedup(time_limit, worker_counts, positions, guided):
+    """Search the same boards with each number of workers and print the
+    playouts per second and the share of moves agreeing with one worker"""
+    print("{:>8} {:>10} {:>11} {:>9}".format(
+        "workers", "playouts", "playouts/s", "same move"))
+    serial_moves = None
+
+    for workers in worker_counts:
+        with MonteCarloSearch(workers, guided, random.Random(0)) as mcts:
+            if mcts.pool is not None:
+                # Start the processes before timing
+                mcts.pool.submit(int).result()
+
+            count = 0
+            moves = []
+            start = time.monotonic()
+
+            for board in positions:
+                children, playouts, depth, pv = mcts.search(
+                    board.own, board.opp,
+                    deadline=time.monotonic() + time_limit / 1000)
+                count += playouts
+                moves.append(pv[0])
+
+            elapsed = time.monotonic() - start
+
+        if serial_moves is None:
+            serial_moves = moves
+
+        same = sum(a == b for a, b in zip(moves, serial_moves))
+        print("{:>8} {:>10} {:>11.0f} {:>8.0%}".format(
+            workers, count, count / elapsed, same / len(moves)))
+
+
+if __name__ == '__main__':
+    from reversi.parallel import get_test_positions
+
+    parser = argparse.ArgumentParser(
+        description="Playouts per second of the root-parallel MCTS")
+    parser.add_argument('--time', type=int, default=1000,
+                        help="thinking time per board in milliseconds")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--positions', type=int, default=8,
+                        help="number of midgame boards to search")
+    parser.add_argument('--random', action='store_true',
+                        help="uniformly random playouts, not guided")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report_speedup(args.time, args.workers,
+                   get_test_positions(args.positions, 20, args.seed),
+                   not args.random)
@@ -9,7 +9,7 @@ class Panel(Gtk.VBox):
 
     """Game right panel"""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, debug=False, **kwargs):
         super().__init__(*args, **kwargs)
         self.set_size_request(200, 200)
 
@@ -38,6 +38,9 @@ class Panel(Gtk.VBox):
         lbl_show_hints = Gtk.Label(halign=Gtk.Align.START)
         lbl_show_hints.set_label('Show Hints')
 
+        lbl_show_scores = Gtk.Label(halign=Gtk.Align.START)
+        lbl_show_scores.set_label('Show Scores')
+
         self.lbl_turn_count = Gtk.Label(halign=Gtk.Align.END)
         self.lbl_turn_count.set_label(repr(self.turn))
 
@@ -55,6 +58,7 @@ class Panel(Gtk.VBox):
         self.btn_quit.set_label("Quit")
 
         self.switch_hint = Gtk.Switch(valign=Gtk.Align.END)
+        self.switch_scores = Gtk.Switch(valign=Gtk.Align.END)
 
         panel_listbox = Gtk.ListBox(selection_mode=Gtk.SelectionMode.NONE)
 
@@ -106,6 +110,37 @@ class Panel(Gtk.VBox):
         row.add(lbl_blank)
         panel_listbox.add(row)
 
+        # Hints row
+        row = Gtk.ListBoxRow()
+        hbox = Gtk.HBox(spacing=50)
+        hbox.add(lbl_show_hints)
+        hbox.add(self.switch_hint)
+        row.add(hbox)
+        panel_listbox.add(row)
+
+        # Hint scores row
+        row = Gtk.ListBoxRow()
+        hbox = Gtk.HBox(spacing=50)
+        hbox.add(lbl_show_scores)
+        hbox.add(self.switch_scores)
+        row.add(hbox)
+        panel_listbox.add(row)
+
+        # Search stats of the AI's last move
+        self.lbl_stats = None
+
+        if debug:
+            row = Gtk.ListBoxRow()
+            lbl_search = Gtk.Label()
+            lbl_search.set_markup("<b>Search</b>")
+            row.add(lbl_search)
+            panel_listbox.add(row)
+
+            row = Gtk.ListBoxRow()
+            self.lbl_stats = Gtk.Label(halign=Gtk.Align.START)
+            row.add(self.lbl_stats)
+            panel_listbox.add(row)
+
         self.pack_start(panel_listbox, True, True, 0)
         self.pack_end(self.btn_quit, False, True, 0)
         self.pack_end(self.btn_start, False, True, 0)
@@ -132,3 +167,14 @@ class Panel(Gtk.VBox):
         """
         self.turn += 1
         self.lbl_turn_count.set_label(repr(self.turn))
+
+    def set_stats(self, stats):
+        """Show the search stats of the AI's last move, if the panel was
+        created with debug
+
+        :stats: SearchStats
+        :returns: None
+
+        """
+        if self.lbl_stats is not None:
+            self.lbl_stats.set_label(stats.get_summary())
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import time
+
+from reversi.algorithm import Algorithm, Search, SearchCancelled, \
+    SearchTimeout
+from reversi.bitboard import Bitboard
+from reversi.pattern import PatternBoard
+from reversi.game import Player, Utilities
+from reversi.transposition import TranspositionTable
+
+# State of a pool worker process, set up by _init_worker
+_alpha = None
+_stop = None
+_table = None
+
+
+def _init_worker(alpha, stop, table_size_mb):
+    """Initialize a pool worker process"""
+    global _alpha, _stop, _table
+
+    _alpha = alpha
+    _stop = stop
+    _table = TranspositionTable(table_size_mb)
+
+
+def _search_reply(depth, board, alpha, search):
+    """Search the board after a root move, the opponent to move, one reply
+    at a time. The bound is raised to the shared alpha before every reply,
+    so the replies searched later cut off as soon as another worker finds
+    a better root move.
+
+    :returns: score of the root move
+    """
+    moves = board.get_moves()
+
+    # Passes and the last ply are left to negamax
+    if depth == 1 or not moves:
+        return -Algorithm.negamax(depth - 1, board, -Algorithm.INFINITY,
+                                  -alpha, search)
+
+    entry = search.table.probe(board.hash)
+    first = entry[2] if entry is not None else None
+    best = -Algorithm.INFINITY
+
+    for square in Algorithm.order_moves(board, moves, depth - 1, first,
+                                        search.order):
+        alpha = max(alpha, _alpha.value)
+
+        if best >= -alpha:
+            break
+
+        board.make_move(square)
+        score = -Algorithm.negamax(depth - 2, board, alpha, -best, search)
+        board.undo_move()
+
+        best = max(best, score)
+
+    return -best
+
+
+def _search_move(own, opp, player, opponent, square, depth, deadline,
+                 generation):
+    """Search one root move in a pool worker
+
+    The window starts at the shared alpha, is raised to it before every
+    reply, and the shared alpha is raised when the move turns out better.
+    The search stops at the deadline or once the shared stop event is set.
+
+    :returns: tuple (square, score, nodes), score is None when stopped
+    """
+    # Entries of the previous root searches become replaceable
+    if _table.generation != generation:
+        _table.generation = generation
+
+    board = PatternBoard(own, opp, player, opponent)
+    search = Search(_table, deadline, _stop)
+    alpha = _alpha.value
+
+    board.make_move(square)
+
+    try:
+        score = _search_reply(depth, board, alpha, search)
+    except (SearchTimeout, SearchCancelled):
+        return square, None, search.nodes
+
+    if score > alpha:
+        with _alpha.get_lock():
+            if score > _alpha.value:
+                _alpha.value = score
+
+    return square, score, search.nodes
+
+
+class ParallelSearch:
+    """Root-parallel negamax on a pool of processes.
+
+    The eldest root move is searched first in this process to get a bound,
+    then its younger brothers are spread across the pool. Workers share
+    alpha: every reply of a root move is searched with the best score found
+    so far. A shared stop event ends the workers' searches when the root
+    search is cancelled or has timed out.
+    """
+
+    # Time between two checks of the deadline and the cancel event while
+    # the workers search, in seconds
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, workers=None, table_size_mb=16):
+        """
+        :workers: number of processes, defaults to the number of CPUs
+        :table_size_mb: memory cap of the transposition table of each
+        process
+        """
+        self.workers = workers or os.cpu_count()
+        self.alpha = multiprocessing.Value('q', 0)
+        self.stop = multiprocessing.Event()
+        self.generation = 0
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            self.workers, initializer=_init_worker,
+            initargs=(self.alpha, self.stop, table_size_mb)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self.pool.shutdown(cancel_futures=True)
+
+    def do_search(self, depth, matrix, player, avail_moves, table=None):
+        """Parallel counterpart of Algorithm.do_negamax
+
+        :returns: pair [position, value] with value relative to ``player``
+        """
+        # Raise exception (unhandled case)
+        if not avail_moves:
+            raise Exception("Encountered Error!")
+
+        board = PatternBoard.from_matrix(matrix, player,
+                                         Utilities.get_opponent(player))
+
+        if table is None:
+            table = TranspositionTable()
+
+        table.new_search()
+        square, val = self.negamax_root(
+            depth, board, Bitboard.from_positions(avail_moves), Search(table)
+        )
+
+        return [Bitboard.to_position(square), val]
+
+    def negamax_root(self, depth, board, moves, search, first=None):
+        """Search every root move, same contract as Algorithm.negamax_root
+        so it can be given to do_iterative_deepening as ``root_search``
+
+        :returns: pair [square, score]
+        """
+        if first is None:
+            entry = search.table.probe(board.hash)
+            first = entry[2] if entry is not None else None
+
+        ordered = Algorithm.order_moves(board, moves, depth, first,
+                                        search.order)
+        stack_size = len(board.stack)
+
+        # Eldest brother, for a first bound
+        board.make_move(ordered[0])
+
+        try:
+            score = -Algorithm.negamax(depth - 1, board, -Algorithm.INFINITY,
+                                       Algorithm.INFINITY, search)
+        finally:
+            while len(board.stack) > stack_size:
+                board.undo_move()
+
+        best = [ordered[0], score]
+        self.alpha.value = score
+        self.stop.clear()
+        self.generation += 1
+
+        # Younger brothers
+        futures = [self.pool.submit(_search_move, board.own, board.opp,
+                                    board.player, board.opponent, square,
+                                    depth, search.deadline, self.generation)
+                   for square in ordered[1:]]
+        timed_out = False
+
+        pending = futures
+
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, ParallelSearch.POLL_INTERVAL,
+                    concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    square, score, nodes = future.result()
+                    search.nodes += nodes
+
+                    if score is None:
+                        timed_out = True
+                    elif score > best[1]:
+                        best = [square, score]
+
+                search.check_deadline()
+        finally:
+            # Stop the running searches and wait for them, so none of them
+            # is still running when the stop event is cleared again
+            self.stop.set()
+
+            for future in futures:
+                future.cancel()
+
+            concurrent.futures.wait(futures)
+
+        if timed_out:
+            raise SearchTimeout()
+
+        search.table.store(board.hash, depth, TranspositionTable.EXACT,
+                           best[0], best[1])
+
+        return best
+
+
+def get_test_positions(count, moves, seed=0):
+    """Get boards reached by playing random moves from the start
+
+    :returns: list of PatternBoard
+    """
+    generator = random.Random(seed)
+    boards = []
+
+    while len(boards) < count:
+        matrix = [[0 for col in range(8)] for row in range(8)]
+        matrix[3][4] = matrix[4][3] = Player.PLAYER
+        matrix[3][3] = matrix[4][4] = Player.COMPUTER
+        board = PatternBoard.from_matrix(matrix, Player.PLAYER,
+                                         Player.COMPUTER)
+
+        for i in range(moves):
+            squares = Bitboard.to_squares(board.get_moves())
+
+            if not squares:
+                break
+
+            board.make_move(generator.choice(squares))
+
+        if board.get_moves():
+            boards.append(PatternBoard(board.own, board.opp, board.player,
+                                       board.opponent))
+
+    return boards
+
+
+def report_speedup(depth, worker_counts, positions):
+    """Time fixed depth searches of the same boards with each number of
+    workers and print the speedup over the serial search"""
+    print("{:>8} {:>9} {:>11} {:>11} {:>8}".format(
+        "workers", "time (s)", "nodes", "nodes/s", "speedup"))
+
+    def run(root_search):
+        nodes = 0
+        start = time.monotonic()
+
+        for board in positions:
+            search = Search(TranspositionTable())
+            root_search(depth, board, board.get_moves(), search)
+            nodes += search.nodes
+
+        return time.monotonic() - start, nodes
+
+    serial_time, nodes = run(Algorithm.negamax_root)
+    print("{:>8} {:>9.3f} {:>11} {:>11.0f} {:>8.2f}".format(
+        "serial", serial_time, nodes, nodes / serial_time, 1))
+
+    for workers in worker_counts:
+        with ParallelSearch(workers) as parallel:
+            # Start the processes before timing
+            parallel.pool.submit(int).result()
+            elapsed, nodes = run(parallel.negamax_root)
+
+        print("{:>8} {:>9.3f} {:>11} {:>11.0f} {:>8.2f}".format(
+            workers, elapsed, nodes, nodes / elapsed, serial_time / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Speedup report of the root-parallel search")
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--positions', type=int, default=8,
+                        help="number of midgame boards to search")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report_speedup(args.depth, args.workers,
+                   get_test_positions(args.positions, 20, args.seed))
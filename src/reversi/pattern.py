@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+import sys
+import zlib
+from array import array
+from operator import getitem
+
+from reversi.bitboard import Bitboard, Board
+from reversi.game import Field, Player
+
+
+def _transform(square, symmetry):
+    """Map a square by one of the 8 symmetries of the board"""
+    row, col = divmod(square, 8)
+
+    if symmetry & 1:
+        col = 7 - col
+    if symmetry & 2:
+        row = 7 - row
+    if symmetry & 4:
+        row, col = col, row
+
+    return row * 8 + col
+
+
+def _make_instances(types):
+    """Place every pattern type on the board in all its distinct symmetries
+
+    :returns: list of tuples (type index, squares)
+    """
+    instances = []
+
+    for index, (name, squares) in enumerate(types):
+        seen = set()
+
+        for symmetry in range(8):
+            mapped = tuple(_transform(s, symmetry) for s in squares)
+
+            if frozenset(mapped) not in seen:
+                seen.add(frozenset(mapped))
+                instances.append((index, mapped))
+
+    return instances
+
+
+def _make_squares(instances):
+    """Get the instances covering every square and the power of 3 of the
+    square's digit in them
+
+    :returns: list of 64 tuples of pairs (instance, power)
+    """
+    squares = [[] for square in range(64)]
+
+    for instance, (index, instance_squares) in enumerate(instances):
+        for digit, square in enumerate(reversed(instance_squares)):
+            squares[square].append((instance, 3 ** digit))
+
+    return [tuple(updates) for updates in squares]
+
+
+class Pattern:
+    """Pattern instances of the board and their base-3 indices.
+
+    An instance is a fixed sequence of squares, its index the base-3 number
+    of their contents with the first square as the highest digit. Digits
+    are the tiles: 0 empty, 1 Player.PLAYER, 2 Player.COMPUTER. All
+    instances of a type, its rotations and mirrors, share one weight table.
+    """
+
+    # Base squares of every type, square = row * 8 + col
+    TYPES = (
+        # Edge with both X squares
+        ('edge_2x', (0, 1, 2, 3, 4, 5, 6, 7, 9, 14)),
+        ('corner_3x3', (0, 1, 2, 8, 9, 10, 16, 17, 18)),
+        ('corner_2x5', (0, 1, 2, 3, 4, 8, 9, 10, 11, 12)),
+        ('line_2', tuple(range(8, 16))),
+        ('line_3', tuple(range(16, 24))),
+        ('line_4', tuple(range(24, 32))),
+        ('diagonal_8', tuple(range(0, 64, 9))),
+        ('diagonal_7', tuple(range(1, 56, 9))),
+        ('diagonal_6', tuple(range(2, 48, 9))),
+        ('diagonal_5', tuple(range(3, 40, 9))),
+        ('diagonal_4', (3, 10, 17, 24)),
+    )
+
+    INSTANCES = _make_instances(TYPES)
+
+    # Instance updates of every square: tuples (instance, 3 ** digit)
+    SQUARES = _make_squares(INSTANCES)
+
+    # Game phases with their own weights, by number of discs on the board
+    PHASES = 6
+    PHASE = tuple(max(0, min(discs - 5, 50)) // 10 for discs in range(65))
+
+    @staticmethod
+    def get_indices(black, white):
+        """Get the index of every instance
+
+        :black: bitboard of Player.PLAYER
+        :white: bitboard of Player.COMPUTER
+        :returns: list of indices in INSTANCES order
+        """
+        indices = [0] * len(Pattern.INSTANCES)
+
+        for square in Bitboard.to_squares(black):
+            for instance, power in Pattern.SQUARES[square]:
+                indices[instance] += power
+
+        for square in Bitboard.to_squares(white):
+            for instance, power in Pattern.SQUARES[square]:
+                indices[instance] += 2 * power
+
+        return indices
+
+    @staticmethod
+    def get_swapped(length):
+        """Get the index of every board of ``length`` squares with both
+        colours exchanged
+
+        :returns: list, item i is the swapped index of i
+        """
+        swapped = [0]
+
+        for i in range(length):
+            swapped = [index * 3 + digit for index in swapped
+                       for digit in (0, 2, 1)]
+
+        return swapped
+
+
+class PatternBoard(Board):
+    """Board keeping the pattern indices up to date on every move, so
+    evaluating it is a lookup per instance"""
+
+    # Updates of a disc of the tile put on every square:
+    # tuples (instance, change of index)
+    PUT = {tile: [tuple((i, tile * p) for i, p in updates)
+                  for updates in Pattern.SQUARES]
+           for tile in (Player.PLAYER, Player.COMPUTER)}
+
+    # Updates of a disc flipped to the tile on every square
+    FLIP = {Player.PLAYER: [tuple((i, -p) for i, p in updates)
+                            for updates in Pattern.SQUARES],
+            Player.COMPUTER: [tuple((i, p) for i, p in updates)
+                              for updates in Pattern.SQUARES]}
+
+    def __init__(self, own, opp, player, opponent):
+        super().__init__(own, opp, player, opponent)
+
+        if player == Player.PLAYER:
+            self.indices = Pattern.get_indices(own, opp)
+        else:
+            self.indices = Pattern.get_indices(opp, own)
+
+    @staticmethod
+    def from_matrix(matrix, player, opponent):
+        """Create a board from the 8x8 matrix with ``player`` to move"""
+        own, opp = Bitboard.from_matrix(matrix, player, opponent)
+
+        return PatternBoard(own, opp, player, opponent)
+
+    @staticmethod
+    def from_position(position):
+        """Create a board from a Position"""
+        return PatternBoard(position.own, position.opp, position.player,
+                            position.opponent)
+
+    def make_move(self, square):
+        """Move at ``square`` for the side to move and pass the turn.
+
+        :returns: bitboard of flipped pieces
+        """
+        tile = self.player
+        flips = super().make_move(square)
+        indices = self.indices
+
+        for instance, change in PatternBoard.PUT[tile][square]:
+            indices[instance] += change
+
+        flip_updates = PatternBoard.FLIP[tile]
+        bits = flips
+
+        while bits:
+            lowest = bits & -bits
+            bits ^= lowest
+
+            for instance, change in flip_updates[lowest.bit_length() - 1]:
+                indices[instance] += change
+
+        return flips
+
+    def undo_move(self):
+        """Take back the last move or pass"""
+        bit = self.stack[-1]
+
+        if bit:
+            tile = self.opponent
+            indices = self.indices
+
+            for instance, change in PatternBoard.PUT[tile][
+                    bit.bit_length() - 1]:
+                indices[instance] -= change
+
+            flip_updates = PatternBoard.FLIP[tile]
+            bits = self.stack[-2]
+
+            while bits:
+                lowest = bits & -bits
+                bits ^= lowest
+
+                for instance, change in flip_updates[
+                        lowest.bit_length() - 1]:
+                    indices[instance] -= change
+
+        super().undo_move()
+
+
+class PatternWeights:
+    """Weight tables of the pattern evaluation, one set per game phase.
+
+    Tables are seen from the side to move: digit 1 is its disc, 2 the
+    opponent's. Boards are indexed by tile, so the tables are kept a
+    second time with the colours exchanged for Player.COMPUTER to move.
+
+    The weight file is a header followed by every phase: its mobility
+    weight, then the table of every type, as little-endian int32.
+
+    header: magic, version, number of phases, number of types
+
+    Exchanging the colours of the tables takes longer than reading them,
+    so load keeps the exchanged tables in a cache file of the user's cache
+    directory, in the same format.
+    """
+
+    MAGIC = b'RVWT'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHH')
+
+    # Units of the evaluation per disc of final score, for trained weights
+    DISC = 100
+
+    # Units of the evaluation per unit of the hand-tuned square weights
+    SEED_SCALE = 8
+
+    # Hand-tuned weights of the squares and of mobility, the evaluation
+    # used before patterns
+    SEED_SQUARES = ((Field.CORNER_MASK, 20),
+                    (Field.BORDER_ADVANTAGE_MASK, 5),
+                    (Field.BORDER_DISADVANTAGE_MASK, -5),
+                    (Bitboard.from_positions(Field.INNER_DISADVANTAGE), -2),
+                    (Bitboard.from_positions(Field.INNER_NORMAL), 1))
+    SEED_MOBILITY = 3
+
+    # Directory of the cache files of the tables with the colours
+    # exchanged, one per weight file
+    CACHE_DIR = os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or
+        os.path.join(os.path.expanduser('~'), '.cache'), 'reversi')
+
+    def __init__(self, tables, mobility, swapped=None):
+        """
+        :tables: list of PHASES lists of tables, one per type of
+        Pattern.TYPES, item i is the weight of index i
+        :mobility: weight of the mobility difference in every phase
+        :swapped: tables with the colours exchanged, as ``tables``,
+        computed if not given
+        """
+        self.tables = tables
+        self.mobility = mobility
+
+        if swapped is None:
+            swapped = PatternWeights.get_swapped_tables(tables)
+
+        self.swapped = swapped
+
+        # Tables of every instance, by tile to move and phase
+        self.lookup = {Player.PLAYER: [], Player.COMPUTER: []}
+
+        for phase_tables, swapped_tables in zip(tables, swapped):
+            self.lookup[Player.PLAYER].append(
+                [phase_tables[index] for index, squares in Pattern.INSTANCES])
+            self.lookup[Player.COMPUTER].append(
+                [swapped_tables[index]
+                 for index, squares in Pattern.INSTANCES])
+
+    @staticmethod
+    def get_swapped_tables(tables):
+        """Exchange the colours of every table
+
+        :tables: list of lists of tables, as PatternWeights takes them
+        :returns: list of lists of the swapped tables
+        """
+        swaps = [Pattern.get_swapped(len(squares))
+                 for name, squares in Pattern.TYPES]
+        swapped = {}
+
+        for phase_tables in tables:
+            # Phases may share tables, swap each one once
+            for index, table in enumerate(phase_tables):
+                if id(table) not in swapped:
+                    swapped[id(table)] = array(
+                        'i', (table[i] for i in swaps[index]))
+
+        return [[swapped[id(table)] for table in phase_tables]
+                for phase_tables in tables]
+
+    @staticmethod
+    def from_squares(square_weights, mobility, scale):
+        """Build weights adding up to a weight per square.
+
+        Each square's weight is shared among the instances covering it, so
+        the pattern evaluation matches the square evaluation up to rounding.
+
+        :square_weights: list of 64 weights
+        :scale: units of the evaluation per unit of the weights
+        """
+        coverage = [len(updates) for updates in Pattern.SQUARES]
+        tables = []
+
+        for name, squares in Pattern.TYPES:
+            table = [0]
+
+            for square in squares:
+                value = square_weights[square] * scale / coverage[square]
+                table = [v + change for v in table
+                         for change in (0, value, -value)]
+
+            tables.append(array('i', (round(v) for v in table)))
+
+        return PatternWeights([tables] * Pattern.PHASES,
+                              [mobility * scale] * Pattern.PHASES)
+
+    @staticmethod
+    def get_default():
+        """Get the weights seeded from the hand-tuned square weights"""
+        square_weights = [0] * 64
+
+        for mask, weight in PatternWeights.SEED_SQUARES:
+            for square in Bitboard.to_squares(mask):
+                square_weights[square] = weight
+
+        return PatternWeights.from_squares(square_weights,
+                                           PatternWeights.SEED_MOBILITY,
+                                           PatternWeights.SEED_SCALE)
+
+    @staticmethod
+    def load(path):
+        """Read a weight file, and the exchanged tables from its cache file.
+        The cache file is written if it is missing or older than the
+        weight file, and silently left out where it can't be written.
+        """
+        tables, mobility = PatternWeights.read(path)
+        cache_path = PatternWeights.get_cache_path(path)
+        swapped = None
+
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+                swapped, cache_mobility = PatternWeights.read(cache_path)
+        except (OSError, ValueError):
+            pass
+
+        if swapped is None:
+            swapped = PatternWeights.get_swapped_tables(tables)
+
+            # Written aside and renamed, so other processes loading at the
+            # same time never read half of it
+            temp_path = '{}.{}'.format(cache_path, os.getpid())
+
+            try:
+                os.makedirs(PatternWeights.CACHE_DIR, exist_ok=True)
+                PatternWeights.write_tables(temp_path, swapped, mobility)
+                os.replace(temp_path, cache_path)
+            except OSError:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+        return PatternWeights(tables, mobility, swapped)
+
+    @staticmethod
+    def get_cache_path(path):
+        """Get the cache file of the exchanged tables of a weight file,
+        named after the file and a checksum of its absolute path"""
+        path = os.path.abspath(path)
+
+        name = '{}-{:08x}.swapped'.format(os.path.basename(path),
+                                          zlib.crc32(path.encode()))
+
+        return os.path.join(PatternWeights.CACHE_DIR, name)
+
+    @staticmethod
+    def read(path):
+        """Read the tables of a weight file
+
+        :returns: tuple (tables, mobility)
+        """
+        with open(path, 'rb') as f:
+            magic, version, phases, types = PatternWeights.HEADER.unpack(
+                f.read(PatternWeights.HEADER.size))
+
+            if magic != PatternWeights.MAGIC \
+                    or version != PatternWeights.VERSION \
+                    or phases != Pattern.PHASES \
+                    or types != len(Pattern.TYPES):
+                raise ValueError("Not a weight file of these patterns: " +
+                                 path)
+
+            tables = []
+            mobility = []
+
+            for phase in range(phases):
+                phase_tables = []
+                mobility.append(struct.unpack('<i', f.read(4))[0])
+
+                for name, squares in Pattern.TYPES:
+                    table = array('i')
+                    table.frombytes(f.read(4 * 3 ** len(squares)))
+
+                    if len(table) != 3 ** len(squares):
+                        raise ValueError("Truncated weight file: " + path)
+                    if sys.byteorder == 'big':
+                        table.byteswap()
+
+                    phase_tables.append(table)
+
+                tables.append(phase_tables)
+
+        return tables, mobility
+
+    def write(self, path):
+        """Write the weight file"""
+        PatternWeights.write_tables(path, self.tables, self.mobility)
+
+    @staticmethod
+    def write_tables(path, tables, mobility):
+        """Write tables in the format of the weight file"""
+        with open(path, 'wb') as f:
+            f.write(PatternWeights.HEADER.pack(
+                PatternWeights.MAGIC, PatternWeights.VERSION,
+                Pattern.PHASES, len(Pattern.TYPES)))
+
+            for phase_tables, phase_mobility in zip(tables, mobility):
+                f.write(struct.pack('<i', phase_mobility))
+
+                for table in phase_tables:
+                    table = array('i', table)
+
+                    if sys.byteorder == 'big':
+                        table.byteswap()
+
+                    f.write(table.tobytes())
+
+    def evaluate(self, board, moves):
+        """Evaluate a PatternBoard for its side to move
+
+        :moves: bitboard of the legal moves of the side to move
+        """
+        phase = Pattern.PHASE[(board.own | board.opp).bit_count()]
+        score = sum(map(getitem, self.lookup[board.player][phase],
+                        board.indices))
+        mobility = moves.bit_count() - Bitboard.get_moves(
+            board.opp, board.own).bit_count()
+
+        return score + self.mobility[phase] * mobility
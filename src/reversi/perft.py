@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+import time
+
+from reversi.bitboard import Bitboard, Board
+from reversi.game import Field, Player, Utilities
+
+try:
+    import numpy as np
+
+    from reversi.batch import BatchBitboard
+except ImportError:
+    BatchBitboard = None
+
+
+class Perft:
+    """Count the leaf nodes of the game tree to a fixed depth.
+
+    A pass uses up a ply like a move; a finished game is a leaf whatever
+    the depth left. Every board backend must give the same counts.
+
+    The matrix backend is the reference: it walks the rays of every empty
+    cell on the 8x8 matrix, as the game did before bitboards, and shares
+    no code with Bitboard, which the Game API and the other backends use.
+    """
+
+    # Board backends implementing run, batch needs numpy
+    BACKENDS = ('bitboard', 'matrix') + (('batch',) if BatchBitboard else ())
+
+    # Known counts from the start position, Player.PLAYER to move: the
+    # widely published Othello perft numbers, passes counted as a ply
+    START = '-' * 27 + 'OX' + '-' * 6 + 'XO' + '-' * 27 + ' X'
+    START_COUNTS = [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288]
+
+    # Fixed boards: 64 cells row by row (X Player.PLAYER, O
+    # Player.COMPUTER, - empty) and the side to move, with their counts
+    # for depth 1 to 6. There is no published source for these boards:
+    # the counts come from the scan-based matrix backend, the reference
+    # independent of Bitboard, and agree with the bitboard and batch
+    # backends.
+    POSITIONS = [
+        ('--------------------------XXX------XO----OOOOOX-------O-------'
+         'XO X', [6, 54, 363, 3371, 26438, 263216]),
+        ('O-O-----OO------OXX------OOXOO---XOXXX----XOXXX------X--------'
+         'X- X', [11, 146, 1460, 18100, 186112, 2313858]),
+        ('-X-O-XO-X-X-XXO--OOXOOOOOOXOOXO-XOOOX--O-XOX-X-----X---------'
+         '--- X', [10, 139, 1441, 18295, 192409, 2292035]),
+        ('XXXXX--O-XXXOOO-XXXXOOXX-OOOOXOO-OXOXO---OOXX-O--OOOX-----OOX'
+         '--- X', [12, 91, 1007, 7732, 76562, 581630]),
+        # Endgame with passes
+        ('OXXXXX--OOOOOOO-OOXOXOOOOOOXOOO-OOXXOOXX-XXOX-O-XXOOOOOO---OX'
+         'XXX X', [7, 43, 259, 1297, 5894, 21883]),
+        # Side to move has to pass
+        ('---X----X--XX-XXOXXXXXXXOOOXXXXXOOOXOXXXOOXOOXXXOXOOOOXXOOOOO'
+         'XXX X', [1, 7, 20, 125, 359, 1800]),
+        ('-OO-OOOO-XOXXOXO--XOOOXO-XXXOOXO--XXOOXO---XXXXO--O-X-XO-O---'
+         '--- X', [1, 17, 46, 695, 3353, 43166]),
+    ]
+
+    @staticmethod
+    def parse(text):
+        """Parse a board written as in POSITIONS
+
+        :returns: tuple (matrix, player to move)
+        """
+        cells, side = text.split()
+        tiles = {'-': Player.NONE, 'X': Player.PLAYER, 'O': Player.COMPUTER}
+        matrix = [[tiles[cells[row * 8 + col]] for col in range(8)]
+                  for row in range(8)]
+
+        return matrix, tiles[side]
+
+    @staticmethod
+    def count_bitboard(board, depth):
+        """Perft on a Board"""
+        if depth == 0:
+            return 1
+
+        moves = board.get_moves()
+
+        if not moves:
+            board.pass_move()
+
+            if not board.get_moves():
+                board.undo_move()
+                return 1
+
+            nodes = Perft.count_bitboard(board, depth - 1)
+            board.undo_move()
+
+            return nodes
+
+        # Leaves don't have to be visited
+        if depth == 1:
+            return moves.bit_count()
+
+        nodes = 0
+
+        while moves:
+            bit = moves & -moves
+            moves ^= bit
+
+            board.make_move(bit.bit_length() - 1)
+            nodes += Perft.count_bitboard(board, depth - 1)
+            board.undo_move()
+
+        return nodes
+
+    @staticmethod
+    def scan_flips(player, row, col, matrix):
+        """Get the cells flipped by ``player`` moving at the empty cell, by
+        walking the ray of every direction
+
+        :returns: list of [row, col]
+        """
+        opponent = Utilities.get_opponent(player)
+        flips = []
+
+        for row_step, col_step in Field.DIRECTION:
+            ray = []
+            x = row + row_step
+            y = col + col_step
+
+            while 0 <= x < 8 and 0 <= y < 8 and matrix[x][y] == opponent:
+                ray.append([x, y])
+                x += row_step
+                y += col_step
+
+            if ray and 0 <= x < 8 and 0 <= y < 8 and matrix[x][y] == player:
+                flips.extend(ray)
+
+        return flips
+
+    @staticmethod
+    def scan_moves(player, matrix):
+        """Get the legal moves of ``player`` and their flips, by scanning
+        every empty cell
+
+        :returns: list of tuples (row, col, flips)
+        """
+        moves = []
+
+        for row in range(8):
+            for col in range(8):
+                if matrix[row][col] == Player.NONE:
+                    flips = Perft.scan_flips(player, row, col, matrix)
+
+                    if flips:
+                        moves.append((row, col, flips))
+
+        return moves
+
+    @staticmethod
+    def count_matrix(matrix, player, depth):
+        """Perft on the 8x8 matrix with the scan-based move generator"""
+        if depth == 0:
+            return 1
+
+        opponent = Utilities.get_opponent(player)
+        moves = Perft.scan_moves(player, matrix)
+
+        if not moves:
+            if not Perft.scan_moves(opponent, matrix):
+                return 1
+
+            return Perft.count_matrix(matrix, opponent, depth - 1)
+
+        # Leaves don't have to be made
+        if depth == 1:
+            return len(moves)
+
+        nodes = 0
+
+        for row, col, flips in moves:
+            matrix[row][col] = player
+
+            for x, y in flips:
+                matrix[x][y] = player
+
+            nodes += Perft.count_matrix(matrix, opponent, depth - 1)
+
+            for x, y in flips:
+                matrix[x][y] = opponent
+
+            matrix[row][col] = Player.NONE
+
+        return nodes
+
+    @staticmethod
+    def count_batch(own, opp, depth):
+        """Perft on arrays of boards, expanding a whole level at once"""
+        nodes = 0
+
+        for remaining in range(depth, 1, -1):
+            moves = BatchBitboard.get_moves(own, opp)
+            stuck = moves == 0
+
+            # Boards without a move pass, or are finished leaves
+            passed_own = opp[stuck]
+            passed_opp = own[stuck]
+            passes = BatchBitboard.get_moves(passed_own, passed_opp) != 0
+            nodes += int((~passes).sum())
+
+            index, squares = BatchBitboard.get_squares(moves)
+            own, opp = BatchBitboard.make_moves(own[index], opp[index],
+                                                squares)
+            own = np.concatenate((own, passed_own[passes]))
+            opp = np.concatenate((opp, passed_opp[passes]))
+
+        if depth == 0:
+            return nodes + len(own)
+
+        # Leaves don't have to be made, a board without moves has one
+        # child whether it passes or is finished
+        moves = BatchBitboard.get_moves(own, opp)
+
+        return nodes + int(BatchBitboard.count(moves).sum()) + \
+            int((moves == 0).sum())
+
+    @staticmethod
+    def run(backend, text, depth):
+        """Perft of a board written as in POSITIONS on one backend
+
+        :backend: one of BACKENDS
+        :returns: tuple (nodes, seconds)
+        """
+        matrix, player = Perft.parse(text)
+        start = time.perf_counter()
+
+        if backend == 'bitboard':
+            board = Board.from_matrix(matrix, player,
+                                      Utilities.get_opponent(player))
+            nodes = Perft.count_bitboard(board, depth)
+        elif backend == 'batch':
+            own, opp = Bitboard.from_matrix(matrix, player,
+                                            Utilities.get_opponent(player))
+            nodes = Perft.count_batch(np.array([own], dtype=np.uint64),
+                                      np.array([opp], dtype=np.uint64),
+                                      depth)
+        else:  # matrix
+            nodes = Perft.count_matrix(matrix, player, depth)
+
+        return nodes, time.perf_counter() - start
+
+    @staticmethod
+    def get_expected(text, depth):
+        """Get the known count of a board, None if unknown"""
+        if text == Perft.START:
+            counts = Perft.START_COUNTS
+        else:
+            counts = dict(Perft.POSITIONS).get(text)
+
+            if counts is None:
+                return None
+
+            counts = [1] + counts
+
+        return counts[depth] if depth < len(counts) else None
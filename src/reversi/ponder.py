@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import time
+
+from reversi.algorithm import Algorithm
+from reversi.pattern import PatternBoard
+
+
+class Ponder:
+    """Search on the opponent's time.
+
+    While the human thinks, the AI searches the board after the reply it
+    expects, which fills the transposition table, or grows the MCTS tree of
+    the current board, which covers every reply. If the human's move leads
+    to one of the pondered boards the AI's search is a ponder hit: it goes
+    on from the best move and depth pondering completed, or from the
+    subtree, and only gets the thinking time pondering hasn't already
+    used. On a miss the pondered entries are left to be replaced, and the
+    subtree is dropped.
+    """
+
+    # Shortest thinking time after a ponder hit in milliseconds
+    MIN_TIME = 50
+
+    # Longest pondering in milliseconds
+    MAX_TIME = 60000
+
+    def __init__(self):
+        self.positions = set()
+        self.start = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def predict(position, table):
+        """Guess the move of the side to move: the best move stored in the
+        transposition table, or the first ordered move
+
+        :position: Position
+        :returns: square, None without moves
+        """
+        moves = position.get_moves()
+
+        if not moves:
+            return None
+
+        board = PatternBoard.from_position(position)
+        pv = Algorithm.get_pv(board, table, 1)
+
+        return pv[0] if pv else Algorithm.order_moves(board, moves, 0)[0]
+
+    def begin(self, positions):
+        """Start pondering
+
+        :positions: Positions, the AI to move, whose search is a ponder hit
+        """
+        self.positions = set(positions)
+        self.start = time.monotonic()
+
+    def clear(self):
+        """Forget the pondering, e.g. when it has been stopped"""
+        self.positions = set()
+        self.start = None
+
+    def is_pondering(self):
+        """Check if pondering has begun and not been cleared"""
+        return self.start is not None
+
+    def get_time_limit(self, position, time_limit):
+        """End pondering and get the thinking time of the move on the
+        Position
+
+        :time_limit: thinking time without pondering in milliseconds
+        :returns: time left after pondering on a hit, ``time_limit`` on a
+        miss
+        """
+        if self.start is None:
+            return time_limit
+
+        if position in self.positions:
+            self.hits += 1
+            pondered = (time.monotonic() - self.start) * 1000
+            time_limit = max(Ponder.MIN_TIME, time_limit - pondered)
+        else:
+            self.misses += 1
+
+        self.clear()
+
+        return time_limit
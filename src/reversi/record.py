@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from reversi.bitboard import Position
+from reversi.game import Player
+from reversi.stats import SearchStats
+
+
+class GameRecord:
+    """The moves of one game, one byte each, and the settings it was played
+    with.
+
+    A move byte is the square, row * 8 + col, or PASS. Passes are kept, so
+    the sides alternate byte by byte starting with ``first``.
+    """
+
+    PASS = 64
+
+    # Flags of the game header
+    FINISHED = 1
+
+    # moves, first player, game mode, flags, player discs, computer discs,
+    # time limit in ms, start in seconds since the epoch, duration in ms,
+    # thinking time of the AI in ms
+    HEADER = struct.Struct('<HBBBBBxIdII')
+
+    def __init__(self, first, mode, time_limit, start=None):
+        """
+        :first: tile moving first
+        :mode: GameMode of the AI
+        :time_limit: thinking time of the AI per move in milliseconds
+        :start: time.time() of the start, now if not given
+        """
+        self.first = first
+        self.mode = mode
+        self.time_limit = time_limit
+        self.start = time.time() if start is None else start
+        self.moves = bytearray()
+        self.finished = False
+        self.player_discs = 2
+        self.computer_discs = 2
+
+        # In seconds
+        self.duration = 0
+        self.thinking = 0
+
+    def __len__(self):
+        return len(self.moves)
+
+    def add_move(self, square):
+        """Record a move of the side to move"""
+        self.moves.append(square)
+
+    def add_pass(self):
+        """Record a pass of the side to move"""
+        self.moves.append(GameRecord.PASS)
+
+    def finish(self, player_discs, computer_discs, finished):
+        """Record the score and the duration once the game is over
+
+        :finished: whether it was played to the end, not given up
+        """
+        self.player_discs = player_discs
+        self.computer_discs = computer_discs
+        self.finished = finished
+        self.duration = time.time() - self.start
+
+    def replay(self):
+        """Play the moves again from the starting board
+
+        :returns: generator of pairs (Position before the move, square or
+        PASS)
+        """
+        position = Position(0x0000000810000000, 0x0000001008000000,
+                            Player.PLAYER, Player.COMPUTER)
+
+        if self.first != Player.PLAYER:
+            position = position.pass_move()
+
+        for square in self.moves:
+            yield position, square
+
+            if square == GameRecord.PASS:
+                position = position.pass_move()
+            else:
+                position = position.play(square)
+
+    def to_bytes(self):
+        """Get the game header followed by the moves"""
+        return GameRecord.HEADER.pack(
+            len(self.moves), self.first, self.mode,
+            GameRecord.FINISHED if self.finished else 0,
+            self.player_discs, self.computer_discs, self.time_limit,
+            self.start, round(self.duration * 1000),
+            round(self.thinking * 1000)) + bytes(self.moves)
+
+    @staticmethod
+    def from_header(header, moves):
+        """Create a record from the unpacked game header and its moves"""
+        count, first, mode, flags, player_discs, computer_discs, \
+            time_limit, start, duration, thinking = header
+        record = GameRecord(first, mode, time_limit, start)
+        record.moves = bytearray(moves)
+        record.finished = bool(flags & GameRecord.FINISHED)
+        record.player_discs = player_discs
+        record.computer_discs = computer_discs
+        record.duration = duration / 1000
+        record.thinking = thinking / 1000
+
+        return record
+
+
+class GameRecords:
+    """File of game records, a header followed by the games one after
+    another. Games are only ever appended, and read back one at a time.
+
+    header: magic, version, game header size
+    game: GameRecord.HEADER, then its moves
+    """
+
+    MAGIC = b'RVGR'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHH')
+
+    @staticmethod
+    def append(path, records):
+        """Append games to the file, creating it if needed
+
+        :records: list of GameRecord
+        """
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        data = b''.join(record.to_bytes() for record in records)
+
+        with open(path, 'ab') as f:
+            if new:
+                data = GameRecords.HEADER.pack(
+                    GameRecords.MAGIC, GameRecords.VERSION,
+                    GameRecord.HEADER.size) + data
+
+            # One write, so a game is never split by another process
+            # appending
+            f.write(data)
+
+    @staticmethod
+    def check_header(data, path):
+        """Raise ValueError unless ``data`` is the header of a record
+        file"""
+        if len(data) < GameRecords.HEADER.size:
+            raise ValueError("Not a game record file: " + path)
+
+        magic, version, game_size = GameRecords.HEADER.unpack_from(data, 0)
+
+        if magic != GameRecords.MAGIC or version != GameRecords.VERSION \
+                or game_size != GameRecord.HEADER.size:
+            raise ValueError("Not a game record file: " + path)
+
+    @staticmethod
+    def read(path):
+        """Read the games of the file one by one, only the current one is
+        held in memory
+
+        :returns: generator of GameRecord
+        """
+        size = GameRecord.HEADER.size
+
+        with open(path, 'rb') as f:
+            GameRecords.check_header(f.read(GameRecords.HEADER.size), path)
+
+            while True:
+                data = f.read(size)
+
+                if not data:
+                    break
+
+                if len(data) < size:
+                    raise ValueError("Truncated game record file: " + path)
+
+                header = GameRecord.HEADER.unpack(data)
+                moves = f.read(header[0])
+
+                if len(moves) < header[0]:
+                    raise ValueError("Truncated game record file: " + path)
+
+                yield GameRecord.from_header(header, moves)
+
+
+class GameIndex:
+    """Random access to the games of a record file, memory-mapped.
+
+    The index is a file next to the records, INDEX_SUFFIX appended to its
+    name, holding the offset of every game as a little-endian uint64. It
+    is brought up to date on opening, reading only the games appended since
+    it was last built.
+    """
+
+    INDEX_SUFFIX = '.index'
+    OFFSET = struct.Struct('<Q')
+
+    def __init__(self, path):
+        index_path = GameIndex.build(path)
+
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.index = None
+        self.count = os.path.getsize(index_path) // GameIndex.OFFSET.size
+
+        if self.count:
+            with open(index_path, 'rb') as f:
+                self.index = mmap.mmap(f.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        """Get game ``number``, counting from 0"""
+        if not 0 <= number < self.count:
+            raise IndexError("No game " + str(number))
+
+        offset = GameIndex.OFFSET.unpack_from(
+            self.index, number * GameIndex.OFFSET.size)[0]
+        header = GameRecord.HEADER.unpack_from(self.data, offset)
+        start = offset + GameRecord.HEADER.size
+
+        return GameRecord.from_header(header,
+                                      self.data[start:start + header[0]])
+
+    def close(self):
+        """Unmap the files"""
+        self.data.close()
+
+        if self.index is not None:
+            self.index.close()
+
+    @staticmethod
+    def build(path):
+        """Add the games appended since the last build to the index of the
+        record file, rebuilding it if it doesn't match the file
+
+        :returns: path of the index
+        """
+        index_path = path + GameIndex.INDEX_SUFFIX
+        file_size = os.path.getsize(path)
+        offsets = []
+        position = GameRecords.HEADER.size
+
+        with open(path, 'rb') as f:
+            GameRecords.check_header(f.read(GameRecords.HEADER.size), path)
+            mode = 'wb'
+
+            # Go on after the last indexed game
+            if os.path.exists(index_path):
+                index_size = os.path.getsize(index_path)
+
+                if index_size and not index_size % GameIndex.OFFSET.size:
+                    with open(index_path, 'rb') as index:
+                        index.seek(index_size - GameIndex.OFFSET.size)
+                        last = GameIndex.OFFSET.unpack(
+                            index.read(GameIndex.OFFSET.size))[0]
+
+                    if last + GameRecord.HEADER.size <= file_size:
+                        f.seek(last)
+                        header = GameRecord.HEADER.unpack(
+                            f.read(GameRecord.HEADER.size))
+                        position = last + GameRecord.HEADER.size + header[0]
+                        mode = 'ab'
+
+            while position + GameRecord.HEADER.size <= file_size:
+                f.seek(position)
+                count = GameRecord.HEADER.unpack(
+                    f.read(GameRecord.HEADER.size))[0]
+                end = position + GameRecord.HEADER.size + count
+
+                # A game still being written
+                if end > file_size:
+                    break
+
+                offsets.append(position)
+                position = end
+
+        if offsets or mode == 'wb':
+            with open(index_path, mode) as index:
+                index.write(b''.join(GameIndex.OFFSET.pack(offset)
+                                     for offset in offsets))
+
+        return index_path
+
+
+def print_game(record):
+    """Print the header and the moves of a game"""
+    names = {Player.PLAYER: "player", Player.COMPUTER: "computer"}
+    print("started {}, {} first, mode {}, {} ms a move".format(
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.start)),
+        names.get(record.first, "nobody"), record.mode, record.time_limit))
+    print("{} {}-{}, {:.1f}s, AI thinking {:.1f}s".format(
+        "finished" if record.finished else "given up",
+        record.player_discs, record.computer_discs, record.duration,
+        record.thinking))
+    print(" ".join("pass" if square == GameRecord.PASS
+                   else SearchStats.get_square_name(square)
+                   for square in record.moves))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Summarize a game record file, or show one game")
+    parser.add_argument('path')
+    parser.add_argument('--game', type=int,
+                        help="number of the game to show, from 0, through "
+                             "the index")
+    args = parser.parse_args()
+
+    if args.game is not None:
+        games = GameIndex(args.path)
+        print_game(games[args.game])
+        games.close()
+    else:
+        count = finished = moves = 0
+        start = time.monotonic()
+
+        for record in GameRecords.read(args.path):
+            count += 1
+            finished += record.finished
+            moves += len(record)
+
+        elapsed = time.monotonic() - start
+        print("{} games, {} finished, {} moves, read in {:.2f}s".format(
+            count, finished, moves, elapsed))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import json
+
+
+class SearchStats:
+    """What a search did, filled in by the Algorithm searches.
+
+    The totals, iterations and principal variation cost nothing per node
+    and are always kept. The per node counters (nodes per ply, leaves,
+    cutoffs, transposition table probes) are only counted when
+    ``per_node`` is set.
+    """
+
+    def __init__(self, per_node=True):
+        self.per_node = per_node
+
+        # Always kept
+        self.nodes = 0
+        self.time = 0
+        self.depth = 0
+        self.iterations = []
+        self.pv = []
+
+        # Per node counters
+        self.nodes_per_ply = []
+        self.leaves = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+
+    def count_node(self, ply):
+        """Count a node visited ``ply`` moves below the root"""
+        while len(self.nodes_per_ply) <= ply:
+            self.nodes_per_ply.append(0)
+
+        self.nodes_per_ply[ply] += 1
+
+    def add_iteration(self, depth, elapsed, nodes, square, score):
+        """Record a completed iteration of iterative deepening
+
+        :elapsed: time spent on the iteration in seconds
+        :nodes: nodes visited by the iteration
+        """
+        self.depth = depth
+        self.iterations.append({'depth': depth, 'time': elapsed,
+                                'nodes': nodes, 'move': square,
+                                'score': score})
+
+    def get_first_cutoff_rate(self):
+        """Share of the cutoffs made by the first move searched"""
+        return self.first_cutoffs / self.cutoffs if self.cutoffs else None
+
+    def get_tt_hit_rate(self):
+        """Share of the transposition table probes finding the board"""
+        return self.tt_hits / self.tt_probes if self.tt_probes else None
+
+    def get_branching_factors(self):
+        """Effective branching factor between each ply and the next"""
+        plies = self.nodes_per_ply
+
+        return [plies[i + 1] / plies[i] for i in range(len(plies) - 1)
+                if plies[i]]
+
+    def get_branching_factor(self):
+        """Effective branching factor of the whole search: growth of the
+        node count from one iteration to the next, or the depth-th root of
+        the node count without iterations"""
+        counts = [i['nodes'] for i in self.iterations if i['nodes']]
+
+        if len(counts) > 1:
+            return (counts[-1] / counts[0]) ** (1 / (len(counts) - 1))
+
+        if self.depth and self.nodes:
+            return self.nodes ** (1 / self.depth)
+
+        return None
+
+    @staticmethod
+    def get_square_name(square):
+        """Name of a square as labelled on the board, e.g. D3"""
+        return 'ABCDEFGH'[square >> 3] + str((square & 7) + 1)
+
+    def to_dict(self):
+        """Get the stats as a dict of plain values"""
+        stats = {'nodes': self.nodes,
+                 'time': self.time,
+                 'nodes_per_second': self.nodes / self.time if self.time
+                 else None,
+                 'depth': self.depth,
+                 'branching_factor': self.get_branching_factor(),
+                 'iterations': self.iterations,
+                 'pv': [self.get_square_name(s) for s in self.pv]}
+
+        if self.per_node:
+            stats.update({'nodes_per_ply': self.nodes_per_ply,
+                          'branching_factors': self.get_branching_factors(),
+                          'leaves': self.leaves,
+                          'cutoffs': self.cutoffs,
+                          'first_cutoff_rate': self.get_first_cutoff_rate(),
+                          'tt_probes': self.tt_probes,
+                          'tt_hit_rate': self.get_tt_hit_rate()})
+
+        return stats
+
+    def to_json(self, **extra):
+        """Get the stats as one line of JSON, with the ``extra`` fields"""
+        stats = self.to_dict()
+        stats.update(extra)
+
+        return json.dumps(stats)
+
+    def get_summary(self):
+        """Get a few lines of text for the debug panel"""
+        lines = ["Depth {}, {} nodes".format(self.depth, self.nodes)]
+
+        if self.time:
+            lines.append("{:.0f} nodes/s, {:.2f}s".format(
+                self.nodes / self.time, self.time))
+
+        branching_factor = self.get_branching_factor()
+
+        if branching_factor is not None:
+            lines.append("Branching factor {:.2f}".format(branching_factor))
+
+        if self.per_node:
+            rate = self.get_first_cutoff_rate()
+
+            if rate is not None:
+                lines.append("{} cutoffs, {:.0%} first move".format(
+                    self.cutoffs, rate))
+
+            rate = self.get_tt_hit_rate()
+
+            if rate is not None:
+                lines.append("TT hits {:.0%} of {}".format(rate,
+                                                           self.tt_probes))
+
+        if self.pv:
+            lines.append("PV " + " ".join(self.get_square_name(s)
+                                          for s in self.pv))
+
+        return "\n".join(lines)
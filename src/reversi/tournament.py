@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import random
+import time
+
+from reversi.algorithm import Algorithm
+from reversi.bitboard import Position
+from reversi.book import OpeningBook
+from reversi.game import Player
+from reversi.mcts import MonteCarloSearch
+from reversi.stats import SearchStats
+from reversi.transposition import TranspositionTable
+
+
+class Engine:
+    """A player of headless games, built from a spec ``kind[:argument]``
+
+    random          random legal move
+    shallow         Algorithm.do_shallow_scan
+    minimax:N       Algorithm.do_minimax, N plies
+    alphabeta:N     Algorithm.do_alpha_beta_pruning, N plies
+    negamax:N       Algorithm.do_negamax, N plies
+    id:MS           Algorithm.do_iterative_deepening, MS milliseconds a move
+    mcts:MS         MonteCarloSearch, MS milliseconds a move
+    playouts:N      MonteCarloSearch, N playouts a move
+    """
+
+    KINDS = {'random': None, 'shallow': None, 'minimax': 3,
+             'alphabeta': 4, 'negamax': 5, 'id': 1000, 'mcts': 1000,
+             'playouts': 1000}
+
+    def __init__(self, spec, book_path=None):
+        kind, _, argument = spec.partition(':')
+
+        if kind not in Engine.KINDS:
+            raise ValueError("Unknown engine: " + spec)
+
+        self.spec = spec
+        self.kind = kind
+        self.argument = int(argument) if argument else Engine.KINDS[kind]
+        self.book = OpeningBook(book_path) if book_path else None
+        self.table = TranspositionTable()
+        self.mcts = MonteCarloSearch()
+
+    def new_game(self):
+        """Forget everything about the previous game"""
+        self.table.clear()
+        self.mcts.tree = None
+
+    def get_move(self, matrix, player, avail_moves, stats):
+        """Choose a move
+
+        :stats: SearchStats filled in by the search
+        :returns: position
+        """
+        if self.kind == 'random':
+            return random.choice(avail_moves)
+
+        if self.kind == 'shallow':
+            return Algorithm.do_shallow_scan(matrix, player, avail_moves,
+                                             stats=stats)[0]
+
+        if self.kind == 'minimax':
+            return Algorithm.do_minimax(self.argument - 1, matrix, player,
+                                        avail_moves, stats)[0]
+
+        if self.kind == 'alphabeta':
+            return Algorithm.do_alpha_beta_pruning(
+                self.argument - 1, matrix, player, avail_moves, stats
+            )[0]
+
+        if self.kind == 'negamax':
+            return Algorithm.do_negamax(self.argument, matrix, player,
+                                        avail_moves, self.table, stats)[0]
+
+        if self.kind == 'mcts':
+            return self.mcts.do_search(self.argument, matrix, player,
+                                       avail_moves, stats=stats)[0]
+
+        if self.kind == 'playouts':
+            return self.mcts.do_search(None, matrix, player, avail_moves,
+                                       self.argument, stats=stats)[0]
+
+        # id
+        return Algorithm.do_iterative_deepening(
+            self.argument, matrix, player, avail_moves, self.table,
+            book=self.book, stats=stats
+        )[0]
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of the values, None without values"""
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    index = max(0, int(round(percent / 100 * len(ordered))) - 1)
+
+    return ordered[min(index, len(ordered) - 1)]
+
+
+# Engines of this process by (spec, book path, tile), reused from game to
+# game instead of allocating their tables again
+_engines = {}
+
+
+def get_engine(spec, book_path, tile):
+    """Get the engine of this process playing ``tile``, reset for a new
+    game"""
+    key = (spec, book_path, tile)
+    engine = _engines.get(key)
+
+    if engine is None:
+        engine = _engines[key] = Engine(spec, book_path)
+
+    engine.new_game()
+
+    return engine
+
+
+def play_game(specs, seed, opening_plies=0, book_path=None,
+              per_node=False):
+    """Play one headless game. Player.PLAYER moves first.
+
+    :specs: engine specs of Player.PLAYER and Player.COMPUTER
+    :seed: seed of the random generator, for ties and the random opening
+    :opening_plies: number of random moves played before the engines
+    :per_node: count the per node search stats too
+    :returns: dict with the final score, the move times in seconds, the
+    node counts of each player and the search stats of every move
+    """
+    random.seed(seed)
+
+    engines = {Player.PLAYER: get_engine(specs[0], book_path,
+                                         Player.PLAYER),
+               Player.COMPUTER: get_engine(specs[1], book_path,
+                                           Player.COMPUTER)}
+    times = {Player.PLAYER: [], Player.COMPUTER: []}
+    nodes = {Player.PLAYER: 0, Player.COMPUTER: 0}
+    counted_time = {Player.PLAYER: 0, Player.COMPUTER: 0}
+    moves = []
+
+    board = Position(0x0000000810000000, 0x0000001008000000,
+                     Player.PLAYER, Player.COMPUTER)
+    ply = 0
+
+    while True:
+        if not board.get_moves():
+            board = board.pass_move()
+
+            # Both has no move, reached to the end game.
+            if not board.get_moves():
+                break
+
+            continue
+
+        player = board.player
+        avail_moves = board.get_positions()
+
+        if ply < opening_plies:
+            position = random.choice(avail_moves)
+        else:
+            stats = SearchStats(per_node)
+            start = time.perf_counter()
+            position = engines[player].get_move(board.to_matrix(), player,
+                                                avail_moves, stats)
+            elapsed = time.perf_counter() - start
+            times[player].append(elapsed)
+
+            if stats.nodes:
+                nodes[player] += stats.nodes
+                counted_time[player] += elapsed
+
+            moves.append(dict(stats.to_dict(), ply=ply,
+                              engine=engines[player].spec))
+
+        board = board.play(position[0] * 8 + position[1])
+        ply += 1
+
+    player_score, computer_score = board.get_discs()
+
+    if board.player == Player.COMPUTER:
+        player_score, computer_score = computer_score, player_score
+
+    return {'score': [player_score, computer_score],
+            'times': [times[Player.PLAYER], times[Player.COMPUTER]],
+            'nodes': [nodes[Player.PLAYER], nodes[Player.COMPUTER]],
+            'counted_time': [counted_time[Player.PLAYER],
+                             counted_time[Player.COMPUTER]],
+            'moves': moves}
+
+
+def run_match(spec_a, spec_b, games, jobs=1, seed=0, opening_plies=0,
+              book_path=None, per_node=False):
+    """Play ``games`` games between two engines, swapping sides every game
+
+    :jobs: number of processes playing games at the same time
+    :per_node: count the per node search stats too
+    :returns: dict with results of engine a and b, the wall time and the
+    search stats of every move
+    """
+    tasks = []
+
+    for i in range(games):
+        specs = (spec_a, spec_b) if i % 2 == 0 else (spec_b, spec_a)
+        tasks.append((specs, seed + i, opening_plies, book_path, per_node))
+
+    start = time.monotonic()
+
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            futures = [pool.submit(play_game, *task) for task in tasks]
+            results = [future.result() for future in futures]
+    else:
+        results = [play_game(*task) for task in tasks]
+
+    summary = {'wall_time': time.monotonic() - start, 'games': games,
+               'engines': [], 'moves': []}
+
+    for i, result in enumerate(results):
+        summary['moves'] += [dict(move, game=i) for move in result['moves']]
+
+    for side, spec in enumerate((spec_a, spec_b)):
+        wins = draws = discs = nodes = counted_time = 0
+        times = []
+
+        for i, result in enumerate(results):
+            # Index of the engine in this game's lists
+            index = side if i % 2 == 0 else 1 - side
+            own = result['score'][index]
+            opp = result['score'][1 - index]
+
+            wins += own > opp
+            draws += own == opp
+            discs += own - opp
+            times += result['times'][index]
+            nodes += result['nodes'][index]
+            counted_time += result['counted_time'][index]
+
+        summary['engines'].append({
+            'spec': spec,
+            'wins': wins,
+            'draws': draws,
+            'losses': games - wins - draws,
+            'disc_diff': discs / games if games else 0,
+            'moves': len(times),
+            'nodes_per_second': nodes / counted_time if counted_time
+            else None,
+            'latency': {p: percentile(times, p) for p in (50, 90, 99, 100)}
+        })
+
+    return summary
+
+
+def print_summary(summary):
+    """Print the result of run_match"""
+    games = summary['games']
+    wall_time = summary['wall_time']
+
+    if not games:
+        print("No games played")
+        return
+
+    print("{} games in {:.1f}s, {:.2f} games/s".format(
+        games, wall_time, games / wall_time if wall_time else 0))
+    print("{:<16} {:>7} {:>9} {:>11} {:>9} {:>9} {:>9} {:>9}".format(
+        "engine", "score", "disc diff", "nodes/s", "p50 ms", "p90 ms",
+        "p99 ms", "max ms"))
+
+    for engine in summary['engines']:
+        score = (engine['wins'] + engine['draws'] / 2) / games * 100
+        nps = engine['nodes_per_second']
+        latency = ["-" if engine['latency'][p] is None
+                   else "{:.1f}".format(engine['latency'][p] * 1000)
+                   for p in (50, 90, 99, 100)]
+
+        print("{:<16} {:>6.1f}% {:>+9.1f} {:>11} {:>9} {:>9} {:>9} "
+              "{:>9}".format(
+                  engine['spec'], score, engine['disc_diff'],
+                  "-" if nps is None else "{:.0f}".format(nps),
+                  *latency))
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import struct
+import time
+from array import array
+
+import numpy as np
+
+from reversi.algorithm import Algorithm, Search
+from reversi.batch import BatchBitboard
+from reversi.bitboard import Bitboard
+from reversi.endgame import Endgame
+from reversi.game import Player
+from reversi.pattern import Pattern, PatternBoard, PatternWeights
+from reversi.transposition import TranspositionTable
+
+
+class TrainingData:
+    """Training positions, a header followed by fixed size records that are
+    appended game by game and read back in chunks through a memory map.
+
+    header: magic, version, record size
+    record: discs of the side to move, discs of the opponent, mobility
+    difference, final disc differential for the side to move
+    """
+
+    MAGIC = b'RVTD'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHH')
+    RECORD = np.dtype([('own', '<u8'), ('opp', '<u8'),
+                       ('mobility', 'i1'), ('score', 'i1')])
+
+    @staticmethod
+    def append(path, records):
+        """Append records to the file, creating it if needed
+
+        :records: list of tuples (own, opp, mobility, score)
+        """
+        new = not os.path.exists(path) or not os.path.getsize(path)
+
+        with open(path, 'ab') as f:
+            if new:
+                f.write(TrainingData.HEADER.pack(
+                    TrainingData.MAGIC, TrainingData.VERSION,
+                    TrainingData.RECORD.itemsize))
+
+            np.array(records, dtype=TrainingData.RECORD).tofile(f)
+
+    @staticmethod
+    def open(path):
+        """Map the records of the file
+
+        :returns: read-only structured array of RECORD
+        """
+        with open(path, 'rb') as f:
+            magic, version, record_size = TrainingData.HEADER.unpack(
+                f.read(TrainingData.HEADER.size))
+
+        if magic != TrainingData.MAGIC or version != TrainingData.VERSION \
+                or record_size != TrainingData.RECORD.itemsize:
+            raise ValueError("Not a training data file: " + path)
+
+        return np.memmap(path, dtype=TrainingData.RECORD, mode='r',
+                         offset=TrainingData.HEADER.size)
+
+    @staticmethod
+    def play_game(rng, table, depth, opening_plies, endgame_empties):
+        """Play one self-play game and label its positions.
+
+        The first moves are random, the next ones are chosen by negamax.
+        From ``endgame_empties`` empty squares on every position is solved
+        exactly, and the positions before it get the solved result.
+
+        :returns: list of tuples (own, opp, mobility, score)
+        """
+        board = PatternBoard(0x0000000810000000, 0x0000001008000000,
+                             Player.PLAYER, Player.COMPUTER)
+        positions = []
+        records = []
+        result = None
+        table.clear()
+
+        while True:
+            moves = board.get_moves()
+
+            if not moves:
+                board.pass_move()
+
+                if not board.get_moves():
+                    # Both has no move, reached to the end game.
+                    diff = board.own.bit_count() - board.opp.bit_count()
+                    break
+
+                continue
+
+            mobility = moves.bit_count() - Bitboard.get_moves(
+                board.opp, board.own).bit_count()
+            empties = 64 - (board.own | board.opp).bit_count()
+            ply = len(board.stack) // 3
+
+            if empties <= endgame_empties:
+                square, diff = Endgame.solve_root(board, moves,
+                                                  Search(table))
+                records.append((board.own, board.opp, mobility, diff))
+
+                if result is None:
+                    result = (board.player, diff)
+            else:
+                positions.append((board.own, board.opp, mobility,
+                                  board.player))
+
+                if ply < opening_plies:
+                    square = rng.choice(Bitboard.to_squares(moves))
+                else:
+                    table.new_search()
+                    square = Algorithm.negamax_root(depth, board, moves,
+                                                    Search(table))[0]
+
+            board.make_move(square)
+
+        if result is None:
+            # Ended before the solved part, the final board is the result
+            result = (board.player, diff)
+
+        player, diff = result
+
+        for own, opp, mobility, tile in positions:
+            records.append((own, opp, mobility,
+                            diff if tile == player else -diff))
+
+        return records
+
+    @staticmethod
+    def generate(path, games, depth=3, opening_plies=10, endgame_empties=12,
+                 seed=0, verbose=False):
+        """Play self-play games and append their positions to the file"""
+        rng = random.Random(seed)
+        table = TranspositionTable()
+        count = 0
+        start = time.monotonic()
+
+        for game in range(games):
+            records = TrainingData.play_game(rng, table, depth,
+                                             opening_plies, endgame_empties)
+            TrainingData.append(path, records)
+            count += len(records)
+
+            if verbose and (game + 1) % 10 == 0:
+                print("{} games, {} positions, {:.1f}s".format(
+                    game + 1, count, time.monotonic() - start))
+
+        return count
+
+
+def _get_offsets(types):
+    """Get the start of every type's table in a row of tables and the end
+    of the last one"""
+    offsets = [0]
+
+    for name, squares in types:
+        offsets.append(offsets[-1] + 3 ** len(squares))
+
+    return offsets
+
+
+class Trainer:
+    """Least squares fit of the pattern weights of every phase.
+
+    Each position is a row of a sparse linear system: a one for the table
+    entry of every pattern instance, the mobility difference, and the
+    final disc differential as target. The normal equations, with a ridge
+    term keeping rare entries near zero, are solved by conjugate gradient.
+    Every iteration streams the data in chunks, so it doesn't have to fit
+    in memory.
+    """
+
+    # Offset of every type's table in the weights of a phase, the
+    # mobility weight comes last
+    OFFSETS = _get_offsets(Pattern.TYPES)
+    PHASE_SIZE = OFFSETS.pop() + 1
+    SIZE = Pattern.PHASES * PHASE_SIZE
+
+    # Pattern.PHASE as an array, by number of discs
+    PHASE = np.array(Pattern.PHASE, dtype=np.int64)
+
+    @staticmethod
+    def get_columns(records):
+        """Get the number of the weight used by every instance of the
+        positions, and of their mobility weight
+
+        :returns: tuple (columns, mobility columns), array of shape
+        (positions, instances) and array of shape (positions,)
+        """
+        own = records['own']
+        opp = records['opp']
+        discs = BatchBitboard.count(own | opp)
+        base = Trainer.PHASE[discs] * Trainer.PHASE_SIZE
+        digits = [((own >> np.uint64(s)) & np.uint64(1)).astype(np.int64) +
+                  2 * ((opp >> np.uint64(s)) & np.uint64(1)).astype(np.int64)
+                  for s in range(64)]
+        columns = np.empty((len(records), len(Pattern.INSTANCES)),
+                           dtype=np.int64)
+
+        for instance, (index, squares) in enumerate(Pattern.INSTANCES):
+            pattern_index = np.zeros(len(records), dtype=np.int64)
+
+            for square in squares:
+                pattern_index = pattern_index * 3 + digits[square]
+
+            columns[:, instance] = base + Trainer.OFFSETS[index] + \
+                pattern_index
+
+        return columns, base + Trainer.PHASE_SIZE - 1
+
+    @staticmethod
+    def get_chunks(data, chunk_size):
+        """Yield the columns, mobility and target of every chunk
+
+        :data: list of structured arrays of TrainingData.RECORD
+        """
+        for part in data:
+            for start in range(0, len(part), chunk_size):
+                records = np.asarray(part[start:start + chunk_size])
+                columns, mobility_columns = Trainer.get_columns(records)
+
+                yield (columns, mobility_columns,
+                       records['mobility'].astype(np.float64),
+                       records['score'].astype(np.float64))
+
+    @staticmethod
+    def multiply(data, weights, chunk_size, ridge):
+        """Compute (A^T A + ridge) weights over all chunks"""
+        product = ridge * weights
+
+        for columns, mobility_columns, mobility, score in \
+                Trainer.get_chunks(data, chunk_size):
+            predicted = weights[columns].sum(axis=1) + \
+                weights[mobility_columns] * mobility
+            product += Trainer.transpose(columns, mobility_columns,
+                                         mobility, predicted)
+
+        return product
+
+    @staticmethod
+    def get_target(data, chunk_size):
+        """Compute A^T b over all chunks"""
+        target = np.zeros(Trainer.SIZE)
+
+        for columns, mobility_columns, mobility, score in \
+                Trainer.get_chunks(data, chunk_size):
+            target += Trainer.transpose(columns, mobility_columns, mobility,
+                                        score)
+
+        return target
+
+    @staticmethod
+    def transpose(columns, mobility_columns, mobility, values):
+        """Compute A^T values for one chunk"""
+        result = np.bincount(columns.ravel(),
+                             np.repeat(values, columns.shape[1]),
+                             minlength=Trainer.SIZE)
+        result += np.bincount(mobility_columns, values * mobility,
+                              minlength=Trainer.SIZE)
+
+        return result
+
+    @staticmethod
+    def get_error(data, weights, chunk_size):
+        """Root mean square error in discs"""
+        error = 0
+        count = 0
+
+        for columns, mobility_columns, mobility, score in \
+                Trainer.get_chunks(data, chunk_size):
+            predicted = weights[columns].sum(axis=1) + \
+                weights[mobility_columns] * mobility
+            error += ((predicted - score) ** 2).sum()
+            count += len(score)
+
+        return (error / max(1, count)) ** 0.5
+
+    @staticmethod
+    def fit(data, iterations=50, ridge=100.0, chunk_size=1 << 16,
+            verbose=False):
+        """Fit the weights to the records
+
+        :data: list of structured arrays of TrainingData.RECORD, e.g.
+        mapped files
+        :returns: array of SIZE weights in discs
+        """
+        # Starting from zero weights, the residual is A^T b
+        weights = np.zeros(Trainer.SIZE)
+        residual = Trainer.get_target(data, chunk_size)
+        direction = residual.copy()
+        norm = residual @ residual
+
+        for iteration in range(iterations):
+            start = time.monotonic()
+            product = Trainer.multiply(data, direction, chunk_size, ridge)
+            step = norm / (direction @ product)
+            weights += step * direction
+            residual -= step * product
+            new_norm = residual @ residual
+
+            if verbose:
+                print("iteration {}: residual {:.3g}, {:.1f}s".format(
+                    iteration + 1, new_norm ** 0.5,
+                    time.monotonic() - start))
+
+            if new_norm < 1e-12:
+                break
+
+            direction = residual + new_norm / norm * direction
+            norm = new_norm
+
+        return weights
+
+    @staticmethod
+    def to_pattern_weights(weights):
+        """Convert fitted weights to PatternWeights, in evaluation units"""
+        weights = np.rint(weights * PatternWeights.DISC).astype('<i4')
+        tables = []
+        mobility = []
+
+        for phase in range(Pattern.PHASES):
+            base = phase * Trainer.PHASE_SIZE
+            phase_tables = []
+
+            for index, (name, squares) in enumerate(Pattern.TYPES):
+                start = base + Trainer.OFFSETS[index]
+                phase_tables.append(array('i', weights[
+                    start:start + 3 ** len(squares)].tolist()))
+
+            tables.append(phase_tables)
+            mobility.append(int(weights[base + Trainer.PHASE_SIZE - 1]))
+
+        return PatternWeights(tables, mobility)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Tune the pattern evaluation on self-play games")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser(
+        'generate', help="append self-play positions to a data file")
+    generate.add_argument('data')
+    generate.add_argument('-n', '--games', type=int, default=100)
+    generate.add_argument('--depth', type=int, default=3,
+                          help="search depth of the self-play moves")
+    generate.add_argument('--opening', type=int, default=10,
+                          help="number of random moves opening every game")
+    generate.add_argument('--endgame', type=int, default=12,
+                          help="number of empty squares solved exactly")
+    generate.add_argument('--seed', type=int, default=0)
+
+    fit = commands.add_parser('fit', help="fit the weights to data files")
+    fit.add_argument('data', nargs='+')
+    fit.add_argument('--iterations', type=int, default=50)
+    fit.add_argument('--ridge', type=float, default=100.0,
+                     help="weight of the penalty on large weights")
+    fit.add_argument('--holdout', type=float, default=0.1,
+                     help="share of positions kept to measure the error")
+    fit.add_argument('--output', default=Algorithm.WEIGHTS_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        count = TrainingData.generate(args.data, args.games, args.depth,
+                                      args.opening, args.endgame, args.seed,
+                                      verbose=True)
+        print("{} positions appended to {}".format(count, args.data))
+    else:
+        # The end of every file is held out
+        train = []
+        test = []
+
+        for path in args.data:
+            records = TrainingData.open(path)
+            split = len(records) - int(len(records) * args.holdout)
+            train.append(records[:split])
+            test.append(records[split:])
+
+        weights = Trainer.fit(train, args.iterations, args.ridge,
+                              verbose=True)
+
+        print("error {:.2f} discs, {:.2f} on the {} held out".format(
+            Trainer.get_error(train, weights, 1 << 16),
+            Trainer.get_error(test, weights, 1 << 16),
+            sum(len(records) for records in test)))
+
+        Trainer.to_pattern_weights(weights).write(args.output)
+        print("weights written to " + args.output)
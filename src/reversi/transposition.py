@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import random
+
+
+def _make_keys(seed):
+    """Generate the Zobrist keys: per tile and square, then the side key"""
+    generator = random.Random(seed)
+    keys = [[0] * 64]
+
+    for tile in range(2):
+        keys.append([generator.getrandbits(64) for square in range(64)])
+
+    return keys, generator.getrandbits(64)
+
+
+class Zobrist:
+    """Random 64-bit keys hashing a board and its side to move.
+
+    The hash of a board is the xor of KEYS[tile][square] for every piece,
+    xor SIDE when the computer is to move. Flipping a piece changes its key
+    from one tile to the other, which is FLIP[square].
+    """
+
+    # Indexed by tile (Player.PLAYER = 1, Player.COMPUTER = 2), then square
+    KEYS, SIDE = _make_keys(20160301)
+    FLIP = [a ^ b for a, b in zip(KEYS[1], KEYS[2])]
+
+    @staticmethod
+    def get_hash(own, opp, player, opponent):
+        """Compute the hash of a board from scratch"""
+        # Tile 2 is Player.COMPUTER
+        key = Zobrist.SIDE if player == 2 else 0
+
+        for bits, tile in ((own, player), (opp, opponent)):
+            keys = Zobrist.KEYS[tile]
+
+            while bits:
+                bit = bits & -bits
+                key ^= keys[bit.bit_length() - 1]
+                bits ^= bit
+
+        return key
+
+
+class TranspositionTable:
+    """Fixed size hash table of searched positions.
+
+    Every bucket has two slots: a depth-preferred slot keeping the deepest
+    search of the bucket and an always-replace slot taking everything else.
+    Entries of older searches (see new_search) are replaced regardless of
+    depth, so the table can be reused across moves of one game.
+    """
+
+    # Bound type of the stored score
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    # Rough cost of a slot in bytes: key, entry tuple and their pointers
+    ENTRY_SIZE = 160
+
+    def __init__(self, size_mb=16):
+        buckets = 1
+        limit = max(1, size_mb * 1024 * 1024 // (2 * self.ENTRY_SIZE))
+
+        # Round down to a power of two so the index is a mask
+        while buckets * 2 <= limit:
+            buckets *= 2
+
+        self.mask = buckets - 1
+        self.keys = [None] * (2 * buckets)
+        self.entries = [None] * (2 * buckets)
+        self.generation = 0
+
+    def clear(self):
+        """Drop every entry"""
+        size = len(self.keys)
+        self.keys = [None] * size
+        self.entries = [None] * size
+        self.generation = 0
+
+    def new_search(self):
+        """Start a new search, entries stored before become replaceable"""
+        self.generation += 1
+
+    def probe(self, key):
+        """Look up the board with given hash
+
+        :returns: tuple (depth, flag, move, score, generation) or None
+        """
+        index = (key & self.mask) << 1
+
+        if self.keys[index] == key:
+            return self.entries[index]
+
+        if self.keys[index + 1] == key:
+            return self.entries[index + 1]
+
+        return None
+
+    def store(self, key, depth, flag, move, score):
+        """Store a search result of the board with given hash"""
+        index = (key & self.mask) << 1
+        entry = self.entries[index]
+
+        if entry is None or self.keys[index] == key \
+                or depth >= entry[0] or entry[4] != self.generation:
+            self.keys[index] = key
+            self.entries[index] = (depth, flag, move, score, self.generation)
+        else:
+            self.keys[index + 1] = key
+            self.entries[index + 1] = (depth, flag, move, score,
+                                       self.generation)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+
+from reversi.algorithm import SearchCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class SearchWorker:
+    """Run AI searches on a background thread.
+
+    Only one search runs at a time, starting a new one cancels the
+    previous and the new thread waits for it to stop before searching, so
+    they never share the table and the UI thread never waits. Results are
+    handed back through ``post`` so the callback runs on the UI thread;
+    results of cancelled searches are dropped. A search failing with an
+    error is logged and the error is handed to the error callback instead.
+    """
+
+    def __init__(self, post):
+        """
+        :post: function(callback, *args) calling callback(*args) on the UI
+        thread later, e.g. GLib.idle_add
+        """
+        self.post = post
+        self.cancel_event = None
+        self.thread = None
+
+    def start(self, task, callback, error_callback=None):
+        """Start a search
+
+        :task: function(cancel) doing the search, ``cancel`` is the
+        threading.Event that aborts it
+        :callback: function(result) called on the UI thread with the
+        result of the task
+        :error_callback: function(error) called on the UI thread with the
+        exception if the task fails, None to only log it
+        """
+        self.cancel()
+
+        cancel = threading.Event()
+        self.cancel_event = cancel
+
+        self.thread = threading.Thread(
+            target=self.__run,
+            args=(task, callback, error_callback, cancel, self.thread),
+            daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        """Cancel the running search, if any"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_event = None
+
+    def is_busy(self):
+        """Check if a search is running"""
+        return self.cancel_event is not None
+
+    def __run(self, task, callback, error_callback, cancel, previous):
+        """Body of the search thread
+
+        :previous: thread of the cancelled search before this one, None if
+        there's none
+        """
+        # A cancelled search stops at its next check
+        if previous is not None:
+            previous.join()
+
+        if cancel.is_set():
+            return
+
+        try:
+            result = task(cancel)
+        except SearchCancelled:
+            return
+        except Exception as error:
+            logger.exception("Search failed")
+
+            if error_callback is not None:
+                self.post(self.__deliver, error_callback, cancel, error)
+
+            return
+
+        self.post(self.__deliver, callback, cancel, result)
+
+    def __deliver(self, callback, cancel, result):
+        """Hand the result to the callback, on the UI thread"""
+        # Cancelled after the search had already finished
+        if cancel.is_set():
+            return False
+
+        self.cancel_event = None
+        callback(result)
+
+        return False  # Run once
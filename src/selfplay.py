@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+
+from reversi.tournament import Engine, print_summary, run_match
+
+parser = argparse.ArgumentParser(
+    description="Play engine vs engine games without the Gtk interface",
+    epilog="engines: " + ", ".join(sorted(Engine.KINDS)) +
+           ", with an optional :depth, :milliseconds or :playouts, "
+           "e.g. negamax:6"
+)
+parser.add_argument('engine_a')
+parser.add_argument('engine_b')
+parser.add_argument('-n', '--games', type=int, default=10)
+parser.add_argument('-j', '--jobs', type=int, default=1,
+                    help="number of games played in parallel")
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--opening', type=int, default=0,
+                    help="number of random moves opening every game")
+parser.add_argument('--book', help="opening book used by the id engine")
+parser.add_argument('--stats', metavar='FILE',
+                    help="write the search stats of every move as JSON lines")
+args = parser.parse_args()
+
+summary = run_match(args.engine_a, args.engine_b, args.games, args.jobs,
+                    args.seed, args.opening, args.book,
+                    per_node=args.stats is not None)
+print_summary(summary)
+
+if args.stats:
+    with open(args.stats, 'w') as f:
+        for move in summary['moves']:
+            f.write(json.dumps(move) + "\n")